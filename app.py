@@ -1,14 +1,17 @@
 import streamlit as st
-import asyncio
 import json
-import sys
 import os
-from PIL import Image
+import time
 import requests
-from io import BytesIO
-import pandas as pd
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from product_research import EcommerceAgent  
+from image_cache import ThumbnailCache
+from product_table import ProductTable
+
+# The search service keeps warm browsers, connections and caches between searches (see service.py)
+SEARCH_SERVICE_URL = os.environ.get("SEARCH_SERVICE_URL", "http://localhost:8000")
+
+# Results stay in the session so sorting and filtering never trigger a new scrape
+RESULTS_TTL = int(os.environ.get("RESULTS_TTL", "900"))
+MAX_STORED_QUERIES = 10
 
 st.set_page_config(
     page_title="Product Comparison Tool",
@@ -59,26 +62,29 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Thumbnails are shared by every session of this Streamlit process
+@st.cache_resource
+def get_thumbnail_cache():
+    return ThumbnailCache(os.environ.get("THUMBNAIL_CACHE_DIR", ".thumbnail_cache"))
+
 # Function to load and display image
 def load_image(image_url):
     try:
         if image_url:
-            response = requests.get(image_url)
-            img = Image.open(BytesIO(response.content))
-            return img
+            return get_thumbnail_cache().load(image_url)
         return None
     except Exception as e:
         st.error(f"Error loading image: {e}")
         return None
 
-# Function to run async code
-def run_async(coroutine):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(coroutine)
-    finally:
-        loop.close()
+# Stream results from the search service, one event per platform as it finishes
+def stream_search(query, max_results, on_event):
+    params = {"q": query, "max_results": max_results}
+    with requests.get(f"{SEARCH_SERVICE_URL}/search/stream", params=params, stream=True, timeout=(5, 300)) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if line:
+                on_event(json.loads(line))
 
 # Title and description
 st.title("🔍 Product Comparison Tool")
@@ -99,134 +105,174 @@ show_flipkart = st.sidebar.checkbox("Show Flipkart Products", value=True)
 sort_options = ["Price: Low to High", "Price: High to Low", "Rating: High to Low"]
 sort_by = st.sidebar.selectbox("Sort By", sort_options)
 
-# Function to normalize price string to a number
-def normalize_price(price_str):
-    if not price_str or price_str == "Not available":
-        return float('inf')  # So items without price appear last when sorting by price
-    # Extract just the numbers
-    try:
-        # Remove currency symbols and commas
-        price_str = price_str.replace('₹', '').replace(',', '').replace('$', '').strip()
-        # Find first number in the string
-        import re
-        price_match = re.search(r'\d+(\.\d+)?', price_str)
-        if price_match:
-            return float(price_match.group(0))
-        return float('inf')
-    except:
-        return float('inf')
-
-# Function to normalize rating string to a number
-def normalize_rating(rating_str):
-    if not rating_str or rating_str == "No rating":
-        return 0
-    try:
-        # Extract numbers from string like "4.5 stars" or "4.5 out of 5"
-        import re
-        rating_match = re.search(r'(\d+\.\d+|\d+)', rating_str)
-        if rating_match:
-            return float(rating_match.group(0))
-        return 0
-    except:
-        return 0
-
-# Search button
-if st.button("Search Products"):
-    if search_query:
-        with st.spinner(f"Searching for '{search_query}' on Amazon and Flipkart..."):
-            # Initialize the EcommerceAgent class from PRF2
-            ecommerce_agent = EcommerceAgent()
-            
-            # Run the search
-            try:
-                results = run_async(ecommerce_agent.search_all_products(search_query))
+# Result depth, deeper searches fetch more result pages from each platform
+max_results = st.sidebar.slider("Results per platform", min_value=5, max_value=100, value=5, step=5)
+
+# Filter products based on sidebar selections and sort them, on the columnar table rather than per dict
+def filter_and_sort(table):
+    sources = [source for source, shown in (("Amazon", show_amazon), ("Flipkart", show_flipkart)) if shown]
+    table = table.filter(sources=sources)
+    
+    # Sort products; products without a price sort as the most expensive
+    if sort_by == "Price: Low to High":
+        table = table.sort("price")
+    elif sort_by == "Price: High to Low":
+        table = table.sort("price", descending=True)
+    elif sort_by == "Rating: High to Low":
+        table = table.sort("rating", descending=True)
+    return table
+
+# Display products in a grid
+def render_products(table):
+    filtered_products = table.to_records()
+    # Download every image of the result set in parallel before the cards render
+    get_thumbnail_cache().prefetch(product.get("image") for product in filtered_products)
+    
+    columns = 2  # Show products in 2 columns
+    rows = (len(filtered_products) + columns - 1) // columns  # Calculate number of rows needed
+    
+    for i in range(rows):
+        cols = st.columns(columns)
+        for j in range(columns):
+            idx = i * columns + j
+            if idx < len(filtered_products):
+                product = filtered_products[idx]
                 
-                if results["total_found"] == 0:
-                    st.warning("No products found. Please try a different search term.")
-                else:
-                    st.success(f"Found {results['total_found']} products! ({results['amazon_count']} from Amazon, {results['flipkart_count']} from Flipkart)")
-                    
-                    # Filter products based on sidebar selections
-                    filtered_products = []
-                    for product in results["products"]:
-                        if (product["source"] == "Amazon" and show_amazon) or \
-                           (product["source"] == "Flipkart" and show_flipkart):
-                            filtered_products.append(product)
-                    
-                    # Sort products
-                    if sort_by == "Price: Low to High":
-                        filtered_products.sort(key=lambda x: normalize_price(x.get("price", "Not available")))
-                    elif sort_by == "Price: High to Low":
-                        filtered_products.sort(key=lambda x: normalize_price(x.get("price", "Not available")), reverse=True)
-                    elif sort_by == "Rating: High to Low":
-                        filtered_products.sort(key=lambda x: normalize_rating(x.get("rating", "No rating")), reverse=True)
-                    
-                    # Display products in a grid
-                    columns = 2  # Show products in 2 columns
-                    rows = (len(filtered_products) + columns - 1) // columns  # Calculate number of rows needed
-                    
-                    for i in range(rows):
-                        cols = st.columns(columns)
-                        for j in range(columns):
-                            idx = i * columns + j
-                            if idx < len(filtered_products):
-                                product = filtered_products[idx]
-                                
-                                # Determine source for styling
-                                source_class = f"source-{product['source'].lower()}"
-                                
-                                with cols[j]:
-                                    # Product card with expandable details
-                                    with st.expander(f"{product['name'][:50]}...", expanded=False):
-                                        st.markdown(f"<p class='product-name'>{product['name']}</p>", unsafe_allow_html=True)
-                                        
-                                        # Display product image if available
-                                        if "image" in product and product["image"]:
-                                            img = load_image(product["image"])
-                                            if img:
-                                                st.image(img, width=200)
-                                        
-                                        # Basic info
-                                        col1, col2 = st.columns(2)
-                                        with col1:
-                                            st.markdown(f"<p class='price'>{product['price']}</p>", unsafe_allow_html=True)
-                                            st.markdown(f"<p class='{source_class}'>Source: {product['source']}</p>", unsafe_allow_html=True)
-                                        
-                                        with col2:
-                                            st.write(f"Rating: {product['rating']}")
-                                            st.write(f"Reviews: {product['reviews']}")
-                                        
-                                        # Create a link for buy now button
-                                        link = product.get("link", "#")
-                                        if not link or link == "#":
-                                            if product["source"] == "Amazon":
-                                                link = f"https://www.amazon.in/s?k={product['name'].replace(' ', '+')}"
-                                            elif product["source"] == "Flipkart":
-                                                link = f"https://www.flipkart.com/search?q={product['name'].replace(' ', '+')}"
-                                        
-                                        st.markdown(f"<a href='{link}' target='_blank'><button class='buy-button'>Buy Now</button></a>", unsafe_allow_html=True)
-                    
-                    # Add a comparison table
-                    st.subheader("Quick Comparison")
-                    comparison_data = []
-                    for product in filtered_products:
-                        comparison_data.append({
-                            "Product": product['name'][:50] + "...",
-                            "Price": product['price'],
-                            "Rating": product['rating'],
-                            "Source": product['source']
-                        })
-                    
-                    if comparison_data:
-                        comparison_df = pd.DataFrame(comparison_data)
-                        st.dataframe(comparison_df, use_container_width=True)
-                    
-            except Exception as e:
-                st.error(f"Error occurred during search: {str(e)}")
-                st.error("Please check your backend code and make sure it's running correctly.")
+                # Determine source for styling
+                source_class = f"source-{product['source'].lower()}"
+                
+                with cols[j]:
+                    # Product card with expandable details
+                    with st.expander(f"{product['name'][:50]}...", expanded=False):
+                        st.markdown(f"<p class='product-name'>{product['name']}</p>", unsafe_allow_html=True)
+                        
+                        # Display product image if available
+                        if "image" in product and product["image"]:
+                            img = load_image(product["image"])
+                            if img:
+                                st.image(img, width=200)
+                        
+                        # Basic info
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.markdown(f"<p class='price'>{product['price']}</p>", unsafe_allow_html=True)
+                            st.markdown(f"<p class='{source_class}'>Source: {product['source']}</p>", unsafe_allow_html=True)
+                        
+                        with col2:
+                            st.write(f"Rating: {product['rating']}")
+                            st.write(f"Reviews: {product['reviews']}")
+                        
+                        # Create a link for buy now button
+                        link = product.get("link", "#")
+                        if not link or link == "#":
+                            if product["source"] == "Amazon":
+                                link = f"https://www.amazon.in/s?k={product['name'].replace(' ', '+')}"
+                            elif product["source"] == "Flipkart":
+                                link = f"https://www.flipkart.com/search?q={product['name'].replace(' ', '+')}"
+                        
+                        st.markdown(f"<a href='{link}' target='_blank'><button class='buy-button'>Buy Now</button></a>", unsafe_allow_html=True)
+
+# Add a comparison table
+def render_comparison(table):
+    st.subheader("Quick Comparison")
+    if len(table):
+        st.dataframe(table.comparison_frame(), use_container_width=True)
+
+# Same item on both platforms, with the cheapest offer
+def render_matches(matches):
+    if not matches:
+        return
+    st.subheader("Best Price Across Platforms")
+    rows = []
+    for group in matches:
+        offers = {}
+        for product in group["products"]:
+            offers.setdefault(product["source"], product["price"])  # Products are cheapest first
+        rows.append({
+            "Product": group["title"][:50] + "...",
+            "Best Price": group["best_price"],
+            "Best On": group["best_source"],
+            "Amazon": offers.get("Amazon", "-"),
+            "Flipkart": offers.get("Flipkart", "-"),
+            "You Save": f"₹{group['savings']:,.0f}" if group["savings"] else "-",
+        })
+    st.dataframe(rows, use_container_width=True)
+
+# Stored results are keyed on the normalized query and the requested depth
+if "search_results" not in st.session_state:
+    st.session_state.search_results = {}
+
+def results_key(query):
+    return (" ".join(query.lower().split()), max_results)
+
+def store_results(query, results):
+    stored = st.session_state.search_results
+    # The table is built once per search, every rerun then filters and sorts its columns
+    summary = {key: value for key, value in results.items() if key != "products"}
+    stored[results_key(query)] = {"results": summary, "table": ProductTable.from_products(results["products"]),
+                                  "fetched_at": time.time()}
+    # Keep only the most recent queries to bound session memory
+    for key in sorted(stored, key=lambda k: stored[k]["fetched_at"])[:-MAX_STORED_QUERIES]:
+        del stored[key]
+
+def get_stored_search(query):
+    entry = st.session_state.search_results.get(results_key(query))
+    if entry is None:
+        return None
+    if time.time() - entry["fetched_at"] > RESULTS_TTL:
+        return None
+    return entry
+
+# Search button; expired results for the current query are refreshed automatically
+search_clicked = st.button("Search Products")
+expired = bool(search_query) and results_key(search_query) in st.session_state.search_results and get_stored_search(search_query) is None
+if search_clicked or expired:
+    if search_query:
+        status = st.empty()
+        results_area = st.empty()
+        status.info(f"Searching for '{search_query}' on Amazon and Flipkart...")
+        received = []
+        
+        # Render each platform's products as soon as it responds instead of waiting for the slowest one
+        def on_event(event):
+            if event["event"] == "source_complete":
+                received.extend(event["products"])
+                if event.get("status") == "timed_out":
+                    st.warning(f"{event['source'].title()} did not respond in time, showing the other results")
+                elif event.get("error"):
+                    st.error(f"{event['source'].title()} search failed: {event['error']}")
+                status.info(f"{event['source'].title()} returned {event['count']} products, waiting for the rest...")
+                with results_area.container():
+                    render_products(filter_and_sort(ProductTable.from_products(received)))
+            elif event["event"] == "complete":
+                # The final results are rendered from session state below, like every later rerun
+                store_results(search_query, event)
+                status.empty()
+                results_area.empty()
+        
+        # Run the search
+        try:
+            stream_search(search_query, max_results, on_event)
+        except Exception as e:
+            st.error(f"Error occurred during search: {str(e)}")
+            st.error(f"Please check that the search service is running at {SEARCH_SERVICE_URL}.")
     else:
         st.warning("Please enter a search term")
 
+# Render stored results; sidebar changes rerun the script and only re-sort and re-filter this data
+if search_query:
+    entry = get_stored_search(search_query)
+    if entry is not None:
+        results = entry["results"]
+        if results["total_found"] == 0:
+            st.warning("No products found. Please try a different search term.")
+        else:
+            st.success(f"Found {results['total_found']} products! ({results['amazon_count']} from Amazon, {results['flipkart_count']} from Flipkart)")
+            filtered_products = filter_and_sort(entry["table"])
+            render_matches(results.get("matches"))
+            render_products(filtered_products)
+            render_comparison(filtered_products)
+
 # Add information about the app
 st.sidebar.markdown("---")
 st.sidebar.header("About")
@@ -0,0 +1,227 @@
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Iterable, Union, Callable, Tuple
+
+from main import EcommerceAgent
+from metrics import configure_logging
+
+
+class TokenBucket:
+    """Async token bucket allowing `rate` requests per second with bursts up to `capacity`.
+
+    The rate adapts: penalize() halves it when a host looks like it is blocking us and
+    reward() grows it back slowly towards max_rate.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, min_rate: Optional[float] = None,
+                 max_rate: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.min_rate = min_rate if min_rate is not None else rate / 8
+        self.max_rate = max_rate if max_rate is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.stats = {'acquired': 0, 'wait_time_total': 0.0, 'penalties': 0}
+
+    async def acquire(self, tokens: float = 1):
+        started = time.monotonic()
+        # The lock keeps waiters in arrival order so no caller is starved by later ones
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    break
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+        self.stats['acquired'] += 1
+        self.stats['wait_time_total'] += time.monotonic() - started
+
+    def penalize(self):
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._tokens = min(self._tokens, 0)
+        self.stats['penalties'] += 1
+
+    def reward(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['rate'] = self.rate
+        return stats
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+@dataclass
+class BatchQuery:
+    query: str
+    priority: int = 0  # Lower values run first
+    sources: Optional[Tuple[str, ...]] = None
+    max_results: int = 5
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class BatchSearchEngine:
+    """Runs many queries across both agents with per-host token buckets and a global concurrency cap"""
+
+    # Conservative defaults: Amazon is browser-driven and blocks aggressively, Flipkart is plain HTTP
+    DEFAULT_HOST_RATES = {'www.amazon.in': 0.5, 'www.flipkart.com': 2.0}
+
+    def __init__(self, agent: Optional[EcommerceAgent] = None, host_rates: Optional[Dict[str, float]] = None,
+                 max_concurrency: int = 4):
+        self.agent = agent or EcommerceAgent()
+        self.max_concurrency = max_concurrency
+
+        rates = dict(self.DEFAULT_HOST_RATES)
+        rates.update(host_rates or {})
+        self.buckets = {host: TokenBucket(rate) for host, rate in rates.items()}
+        self._site_agents = {'amazon': self.agent.amazon_agent, 'flipkart': self.agent.flipkart_agent}
+        for site_agent in self._site_agents.values():
+            site_agent.rate_limiter = self.buckets.get(site_agent.host)
+
+        self.latencies = []
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'partial': 0, 'products': 0,
+                      'started_at': None, 'finished_at': None}
+
+    async def run(self, queries: Iterable[Union[str, BatchQuery]],
+                  on_result: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """Run every query, highest priority first, and return one result record per query"""
+        queue = asyncio.PriorityQueue()
+        order = itertools.count()
+        for item in queries:
+            item = BatchQuery(item) if isinstance(item, str) else item
+            queue.put_nowait((item.priority, next(order), item))
+            self.stats['submitted'] += 1
+
+        records = []
+        self.stats['started_at'] = self.stats['started_at'] or time.time()
+
+        async def worker():
+            while True:
+                try:
+                    _, _, item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                record = await self._run_one(item)
+                records.append(record)
+                if on_result is not None:
+                    on_result(record)
+
+        await asyncio.gather(*(worker() for _ in range(self.max_concurrency)))
+        self.stats['finished_at'] = time.time()
+        return records
+
+    async def _run_one(self, item: BatchQuery) -> Dict:
+        started = time.monotonic()
+        record = {'query': item.query, 'priority': item.priority}
+        try:
+            results = await self.agent.search_all_products(item.query, item.sources, max_results=item.max_results)
+            record['results'] = results
+            self.stats['completed'] += 1
+            self.stats['products'] += results['total_found']
+            if results['partial']:
+                # Some source failed or timed out; the query completed with the others
+                self.stats['partial'] += 1
+            self._adapt_rates(item, results)
+        except Exception as e:
+            record['error'] = str(e)
+            self.stats['failed'] += 1
+        record['latency'] = time.monotonic() - started
+        self.latencies.append(record['latency'])
+        return record
+
+    def _adapt_rates(self, item: BatchQuery, results: Dict):
+        # A source returning nothing for a real query is the usual sign of a block or captcha page
+        for source in self.agent.resolve_sources(item.sources):
+            bucket = self.buckets.get(self._site_agents[source].host)
+            if bucket is None:
+                continue
+            if results.get(f"{source}_count"):
+                bucket.reward()
+            else:
+                bucket.penalize()
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        end = stats['finished_at'] or time.time()
+        elapsed = end - stats['started_at'] if stats['started_at'] else 0.0
+        done = stats['completed'] + stats['failed']
+        stats['elapsed'] = elapsed
+        stats['queries_per_hour'] = done / elapsed * 3600 if elapsed else 0.0
+        stats['latency'] = {
+            'p50': percentile(self.latencies, 0.5),
+            'p90': percentile(self.latencies, 0.9),
+            'p99': percentile(self.latencies, 0.99),
+            'max': max(self.latencies, default=0.0),
+        }
+        stats['hosts'] = {host: bucket.get_stats() for host, bucket in self.buckets.items()}
+        return stats
+
+
+def read_queries(path: str) -> List[BatchQuery]:
+    """One query per line, optionally prefixed with a numeric priority and a tab"""
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            priority, _, query = line.partition('\t')
+            if query and priority.lstrip('-').isdigit():
+                queries.append(BatchQuery(query.strip(), priority=int(priority)))
+            else:
+                queries.append(BatchQuery(line))
+    return queries
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run a batch of product searches across Amazon and Flipkart")
+    parser.add_argument("queries", help="file with one query per line, optionally 'priority<TAB>query'")
+    parser.add_argument("--out", help="write one JSON result per line to this file")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--amazon-rate", type=float, default=BatchSearchEngine.DEFAULT_HOST_RATES['www.amazon.in'])
+    parser.add_argument("--flipkart-rate", type=float, default=BatchSearchEngine.DEFAULT_HOST_RATES['www.flipkart.com'])
+    parser.add_argument("--max-results", type=int, default=5)
+    args = parser.parse_args()
+    configure_logging()
+
+    queries = read_queries(args.queries)
+    for query in queries:
+        query.max_results = args.max_results
+
+    out = open(args.out, "w", encoding="utf-8") if args.out else None
+
+    def write_result(record):
+        if out is not None:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    async with EcommerceAgent() as agent:
+        engine = BatchSearchEngine(agent, host_rates={'www.amazon.in': args.amazon_rate,
+                                                      'www.flipkart.com': args.flipkart_rate},
+                                   max_concurrency=args.concurrency)
+        try:
+            await engine.run(queries, on_result=write_result)
+        finally:
+            if out is not None:
+                out.close()
+        print(json.dumps(engine.get_stats(), indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,193 @@
+"""Offline extraction benchmark for AmazonAgent and FlipkartAgent.
+
+Runs parse_products() against the saved search result pages in benchmarks/fixtures and reports
+pages/sec, time per extracted field and peak memory per page. Every extracted product is checked
+field by field against the corpus's expected.json, once per page and again after all pages went
+through the same agents, and any difference fails the run. Throughput and memory are compared
+against a local benchmarks/baseline.json; they depend on the machine, so regressions only fail
+the run with --strict.
+
+    python benchmarks/bench_extraction.py
+    python benchmarks/bench_extraction.py --parser selectolax --iterations 50
+    python benchmarks/bench_extraction.py --update-baseline
+    python benchmarks/bench_extraction.py --update-expected
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import List, Dict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+from main import AmazonAgent, FlipkartAgent
+
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+AGENTS = {'amazon': AmazonAgent, 'flipkart': FlipkartAgent}
+
+
+def load_corpus(version: str):
+    corpus_dir = os.path.join(FIXTURES_DIR, version)
+    with open(os.path.join(corpus_dir, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    expected = {}
+    expected_path = os.path.join(corpus_dir, "expected.json")
+    if os.path.exists(expected_path):
+        with open(expected_path, encoding="utf-8") as f:
+            expected = json.load(f)
+    pages = []
+    for page in manifest['pages']:
+        with open(os.path.join(corpus_dir, page['file']), encoding="utf-8") as f:
+            pages.append(dict(page, html=f.read(), expected_values=expected.get(page['file'])))
+    return manifest, pages
+
+
+def extract(agent, page) -> List[Dict]:
+    return [product.to_dict() for product in agent.parse_products(page['html'], limit=None)]
+
+
+def diff_values(page, products: List[Dict], limit: int = 5) -> List[str]:
+    """Fields that differ from the corpus's expected values, at most limit of them"""
+    expected = page['expected_values']
+    if expected is None:
+        return []
+    differences = []
+    if len(products) != len(expected):
+        differences.append(f"{page['file']}: extracted {len(products)} products, expected {len(expected)}")
+    for index, (product, wanted) in enumerate(zip(products, expected)):
+        for field in sorted(set(product) | set(wanted)):
+            if product.get(field) != wanted.get(field):
+                differences.append(f"{page['file']}: product {index} {field} {product.get(field)!r}, "
+                                   f"expected {wanted.get(field)!r}")
+    return differences[:limit]
+
+
+def bench_page(agent, page, iterations: int):
+    """Time repeated extraction of one page and measure its peak allocation once"""
+    timings = {}
+    products = extract(agent, page)
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        agent.parse_products(page['html'], limit=None, timings=timings)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    agent.parse_products(page['html'], limit=None)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    extracted = max(len(products), 1) * iterations
+    return {
+        'products': len(products),
+        'expected_products': page['expected_products'],
+        'pages_per_sec': iterations / elapsed,
+        'ms_per_page': elapsed / iterations * 1000,
+        'field_us_per_product': {field: seconds / extracted * 1e6 for field, seconds in sorted(timings.items())},
+        'peak_kb': peak / 1024,
+        'html_kb': len(page['html'].encode('utf-8')) / 1024,
+    }
+
+
+def run(version: str, parser: str, iterations: int):
+    manifest, pages = load_corpus(version)
+    agents = {site: cls(parser=parser, selector_state_dir=None) for site, cls in AGENTS.items()}
+    results = {}
+    extracted = {}
+    differences = []
+    for page in pages:
+        agent = agents[page['site']]
+        extracted[page['file']] = extract(agent, page)
+        differences.extend(diff_values(page, extracted[page['file']]))
+        results[page['file']] = bench_page(agent, page, iterations)
+
+    # Agents keep selector statistics between pages; what one page taught them must not change another's output
+    for page in reversed(pages):
+        differences.extend(f"after other pages, {difference}"
+                           for difference in diff_values(page, extract(agents[page['site']], page)))
+    return manifest, results, extracted, differences
+
+
+def compare(results, baseline, tolerance: float):
+    """List performance regressions against the baseline: slower parsing or more memory"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['pages_per_sec'] < previous['pages_per_sec'] * (1 - tolerance):
+            regressions.append(f"{name}: {current['pages_per_sec']:.1f} pages/sec, baseline {previous['pages_per_sec']:.1f}")
+        if current['peak_kb'] > previous['peak_kb'] * (1 + tolerance):
+            regressions.append(f"{name}: {current['peak_kb']:.0f} KB peak, baseline {previous['peak_kb']:.0f} KB")
+    return regressions
+
+
+def print_report(results, parser: str, version: str):
+    print(f"Corpus {version}, parser {parser}")
+    print(f"{'page':36} {'products':>9} {'pages/s':>9} {'ms/page':>9} {'peak KB':>9}  per-field us/product")
+    for name, r in results.items():
+        fields = ' '.join(f"{field}={us:.1f}" for field, us in r['field_us_per_product'].items())
+        marker = '' if r['products'] == r['expected_products'] else f"  (expected {r['expected_products']})"
+        print(f"{name:36} {r['products']:>9} {r['pages_per_sec']:>9.1f} {r['ms_per_page']:>9.2f} {r['peak_kb']:>9.0f}  {fields}{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default="v1", help="fixture corpus version under benchmarks/fixtures")
+    parser.add_argument("--parser", default="lxml", help="parser backend: lxml, html.parser or selectolax")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown or memory growth")
+    parser.add_argument("--strict", action="store_true", help="fail on throughput or memory regressions")
+    parser.add_argument("--update-baseline", action="store_true", help="record this machine's throughput baseline")
+    parser.add_argument("--update-expected", action="store_true",
+                        help="record the extracted products as the corpus's expected values")
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON")
+    args = parser.parse_args()
+
+    manifest, results, extracted, differences = run(args.corpus, args.parser, args.iterations)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results, args.parser, args.corpus)
+
+    baselines = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baselines = json.load(f)
+    key = f"{args.corpus}/{args.parser}"
+
+    expected_path = os.path.join(FIXTURES_DIR, args.corpus, "expected.json")
+    if args.update_expected:
+        with open(expected_path, "w", encoding="utf-8") as f:
+            json.dump(extracted, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"Expected values for {args.corpus} updated")
+        return 0
+
+    if args.update_baseline:
+        baselines[key] = results
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Baseline {key} updated")
+        return 0
+
+    mismatched = [name for name, r in results.items() if r['products'] != r['expected_products']]
+    regressions = compare(results, baselines.get(key, {}), args.tolerance)
+    for name in mismatched:
+        print(f"MISMATCH {name}: product count differs from the corpus manifest")
+    for difference in differences:
+        print(f"MISMATCH {difference}")
+    if not os.path.exists(expected_path):
+        print(f"No expected values for {args.corpus}, run with --update-expected to record them")
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if key not in baselines:
+        print(f"No baseline for {key}, run with --update-baseline to record one")
+    return 1 if mismatched or differences or (args.strict and regressions) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
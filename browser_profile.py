@@ -0,0 +1,129 @@
+import json
+import threading
+from typing import List, Dict, Optional, Iterable, Union
+
+# File extensions standing in for each resource type; DevTools URL blocking only matches URLs
+RESOURCE_EXTENSIONS = {
+    'image': ('jpg', 'jpeg', 'png', 'gif', 'webp', 'avif', 'svg', 'ico'),
+    'font': ('woff', 'woff2', 'ttf', 'otf', 'eot'),
+    'stylesheet': ('css',),
+    'media': ('mp4', 'webm', 'm3u8', 'mp3'),
+}
+
+# Third-party ads and analytics never affect the listings on a results page
+TRACKER_URLS = ('*doubleclick.net*', '*googlesyndication.com*', '*google-analytics.com*',
+                '*googletagmanager.com*', '*facebook.net*', '*scorecardresearch.com*')
+
+# Rough transfer sizes per DevTools resource type, used until the profile has seen real ones
+TYPICAL_BYTES = {'Image': 25000, 'Font': 40000, 'Stylesheet': 30000, 'Media': 250000, 'Script': 50000,
+                 'Other': 5000}
+
+
+class BrowserProfile:
+    """What a Selenium browser downloads while loading a page, and a report of what it skipped.
+
+    Resource types and URL patterns are blocked with the DevTools Network.setBlockedURLs command, so
+    blocked requests never leave the browser. Pages are loaded with the given page load strategy;
+    'eager' returns once the DOM is parsed instead of waiting for every subresource.
+    """
+
+    def __init__(self, name: str, block_types: Iterable[str] = (), deny_urls: Iterable[str] = (),
+                 page_load_strategy: str = 'normal', report: bool = True):
+        unknown = set(block_types) - set(RESOURCE_EXTENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown resource types {sorted(unknown)}, choose from {', '.join(RESOURCE_EXTENSIONS)}")
+        self.name = name
+        self.block_types = tuple(block_types)
+        self.deny_urls = tuple(deny_urls)
+        self.page_load_strategy = page_load_strategy
+        self.report = report
+
+        # Observed transfer sizes per resource type: [bytes, responses]
+        self._sizes: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def for_site(self, allow_types: Iterable[str] = (), deny_urls: Iterable[str] = ()) -> 'BrowserProfile':
+        """Copy of this profile with a site's own rules: resource types it needs and extra URLs to deny"""
+        if not self.block_types and not self.deny_urls:
+            # The full profile stays full
+            return self
+        allowed = set(allow_types)
+        return BrowserProfile(self.name, [kind for kind in self.block_types if kind not in allowed],
+                              self.deny_urls + tuple(deny_urls), self.page_load_strategy, self.report)
+
+    def blocked_url_patterns(self) -> List[str]:
+        patterns = []
+        for kind in self.block_types:
+            for extension in RESOURCE_EXTENSIONS[kind]:
+                patterns.extend((f"*.{extension}", f"*.{extension}?*"))
+        patterns.extend(self.deny_urls)
+        return patterns
+
+    def apply_options(self, chrome_options):
+        """Set the options that must be in place before Chrome starts"""
+        chrome_options.page_load_strategy = self.page_load_strategy
+        if self.report:
+            chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+    def apply_driver(self, driver):
+        """Install the URL blocklist in a started driver; it holds for every later navigation in the tab"""
+        patterns = self.blocked_url_patterns()
+        if patterns:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+
+    def begin_page(self, driver):
+        """Drop network events left over from earlier pages before a navigation"""
+        if self.report:
+            driver.get_log('performance')
+
+    def page_report(self, driver) -> Optional[Dict]:
+        """Requests loaded and blocked since begin_page, bytes transferred and an estimate of bytes avoided"""
+        if not self.report:
+            return None
+        types = {}
+        report = {'requests': 0, 'blocked': 0, 'bytes': 0, 'bytes_avoided': 0, 'blocked_by_type': {}}
+        for entry in driver.get_log('performance'):
+            message = json.loads(entry['message'])['message']
+            method, params = message.get('method'), message.get('params', {})
+            if method == 'Network.requestWillBeSent':
+                types[params.get('requestId')] = params.get('type', 'Other')
+            elif method == 'Network.loadingFinished':
+                size = int(params.get('encodedDataLength', 0))
+                report['requests'] += 1
+                report['bytes'] += size
+                self._observe_size(types.get(params.get('requestId'), 'Other'), size)
+            elif method == 'Network.loadingFailed' and params.get('blockedReason'):
+                kind = params.get('type') or types.get(params.get('requestId'), 'Other')
+                report['blocked'] += 1
+                report['blocked_by_type'][kind] = report['blocked_by_type'].get(kind, 0) + 1
+        report['bytes_avoided'] = sum(count * self.typical_size(kind) for kind, count in report['blocked_by_type'].items())
+        return report
+
+    def typical_size(self, kind: str) -> int:
+        with self._lock:
+            total, count = self._sizes.get(kind, (0, 0))
+        return total // count if count else TYPICAL_BYTES.get(kind, TYPICAL_BYTES['Other'])
+
+    def _observe_size(self, kind: str, size: int):
+        with self._lock:
+            sizes = self._sizes.setdefault(kind, [0, 0])
+            sizes[0] += size
+            sizes[1] += 1
+
+
+BROWSER_PROFILES = {
+    'full': lambda: BrowserProfile('full', report=False),
+    'lightweight': lambda: BrowserProfile('lightweight', block_types=('image', 'font', 'stylesheet', 'media'),
+                                          deny_urls=TRACKER_URLS, page_load_strategy='eager'),
+}
+
+
+def get_browser_profile(profile: Union[str, BrowserProfile] = 'lightweight', allow_types: Iterable[str] = (),
+                        deny_urls: Iterable[str] = ()) -> BrowserProfile:
+    """Resolve 'full' or 'lightweight' to a profile carrying the site's rules; profile instances are used as given"""
+    if isinstance(profile, BrowserProfile):
+        return profile
+    if profile not in BROWSER_PROFILES:
+        raise ValueError(f"Unknown browser profile '{profile}', choose from {', '.join(BROWSER_PROFILES)}")
+    return BROWSER_PROFILES[profile]().for_site(allow_types, deny_urls)
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import List, Dict, Optional, Iterable, Tuple
+
+import requests
+from PIL import Image
+
+from metrics import log_event
+
+logger = logging.getLogger("scraper")
+
+
+class ThumbnailCache:
+    """Size-bounded, content-addressed disk cache of product thumbnails with LRU eviction.
+
+    Images are downloaded once, downscaled to thumbnail_size and stored under the SHA-256 of the
+    thumbnail bytes, so listings that share an image share one file. An index maps image URLs to
+    digests; file modification times track recency for eviction.
+    """
+
+    def __init__(self, directory: str = ".thumbnail_cache", max_bytes: int = 50 * 1024 * 1024,
+                 thumbnail_size: Tuple[int, int] = (200, 200), timeout: Tuple[float, float] = (3, 10),
+                 workers: int = 8):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.thumbnail_size = thumbnail_size
+        self.timeout = timeout
+        self.workers = workers
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._index_path = os.path.join(directory, "index.json")
+        self.stats = {'hits': 0, 'misses': 0, 'errors': 0, 'evictions': 0}
+
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._blobs())
+        self._index = {}
+        if os.path.exists(self._index_path):
+            try:
+                with open(self._index_path, encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+
+    def get_path(self, url: str) -> Optional[str]:
+        """Path of the cached thumbnail for url, or None when it is not cached"""
+        with self._lock:
+            digest = self._index.get(url)
+        if digest is None:
+            return None
+        path = self._blob_path(digest)
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            return None
+        return path
+
+    def fetch(self, url: str) -> Optional[str]:
+        """Return the cached thumbnail path for url, downloading and downscaling it if needed"""
+        path = self.get_path(url)
+        if path is not None:
+            self.stats['hits'] += 1
+            return path
+
+        self.stats['misses'] += 1
+        try:
+            response = self._session().get(url, timeout=self.timeout)
+            response.raise_for_status()
+            data = self._make_thumbnail(response.content)
+        except Exception as e:
+            self.stats['errors'] += 1
+            log_event(logger, logging.WARNING, "image_fetch_failed", url=url, error=str(e))
+            return None
+
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self._total_bytes += len(data)
+            self._index[url] = digest
+            self._evict()
+            self._save_index()
+        return path if os.path.exists(path) else None
+
+    def prefetch(self, urls: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Download every missing thumbnail in parallel and return url -> path"""
+        unique = list(dict.fromkeys(url for url in urls if url))
+        if not unique:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(unique))) as executor:
+            return dict(zip(unique, executor.map(self.fetch, unique)))
+
+    def load(self, url: str) -> Optional[Image.Image]:
+        path = self.fetch(url)
+        if path is None:
+            return None
+        with Image.open(path) as img:
+            return img.copy()
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        with self._lock:
+            stats['entries'] = len(self._index)
+            stats['bytes'] = self._total_bytes
+        stats['max_bytes'] = self.max_bytes
+        return stats
+
+    def _make_thumbnail(self, content: bytes) -> bytes:
+        with Image.open(BytesIO(content)) as img:
+            img.thumbnail(self.thumbnail_size)
+            out = BytesIO()
+            if img.mode in ("RGBA", "LA", "P"):
+                img.save(out, format="PNG", optimize=True)
+            else:
+                img.convert("RGB").save(out, format="JPEG", quality=85)
+            return out.getvalue()
+
+    def _session(self) -> requests.Session:
+        # One session per worker thread keeps connections alive to the image CDNs
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _blobs(self) -> List[Tuple[str, int, float]]:
+        blobs = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name == "index.json" or name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                blobs.append((path, stat.st_size, stat.st_mtime))
+        return blobs
+
+    def _evict(self):
+        """Delete least recently used thumbnails once the cache outgrows max_bytes (caller holds the lock)"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        # Evict down to 90% so the directory scan is not repeated on every following write
+        target = self.max_bytes * 0.9
+        blobs = self._blobs()
+        total = sum(size for _, size, _ in blobs)
+        evicted = set()
+        for path, size, _ in sorted(blobs, key=lambda blob: blob[2]):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted.add(os.path.basename(path))
+            self.stats['evictions'] += 1
+        self._total_bytes = total
+        self._index = {url: digest for url, digest in self._index.items() if digest not in evicted}
+
+    def _save_index(self):
+        tmp_path = f"{self._index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
@@ -1,28 +1,747 @@
 import aiohttp
 import asyncio
-from bs4 import BeautifulSoup
 import json
-from typing import List, Dict, Optional
+import os
+from typing import List, Dict, Optional, Callable, Iterable, Tuple, AsyncIterator, Union
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import contextmanager
+import gzip
+from collections import deque, OrderedDict
+import logging
+import queue
 import random
+import threading
 import time
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.keys import Keys
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, WebDriverException, JavascriptException
+
+from browser_profile import BrowserProfile, get_browser_profile
+from matching import ProductMatcher
+from metrics import REGISTRY, configure_logging, log_event
+from parsers import ParserBackend, get_parser_backend
+from price_store import PriceStore
+from product import Product, RUPEE_PRICE_PATTERN
+from product_table import ProductTable
+from selector_engine import SelectorEngine
+
+
+SOURCES = ('amazon', 'flipkart')
+
+logger = logging.getLogger("scraper")
+
+# Shared by every agent in the process; exposed by the service at /metrics/prometheus
+STAGE_SECONDS = REGISTRY.histogram("scraper_stage_seconds", "Time spent in each stage of a scrape",
+                                   ("site", "stage"))
+FIELD_SECONDS = REGISTRY.histogram("scraper_field_seconds", "Time spent extracting one field across a result page",
+                                   ("site", "field"))
+PAGES_TOTAL = REGISTRY.counter("scraper_pages_total", "Result pages requested, by outcome", ("site", "outcome"))
+PRODUCTS_TOTAL = REGISTRY.counter("scraper_products_total", "Products extracted from result pages", ("site",))
+SEARCH_SECONDS = REGISTRY.histogram("search_seconds", "Latency of combined searches, by cache outcome", ("cache",))
+SOURCE_OUTCOMES_TOTAL = REGISTRY.counter("search_source_outcomes_total",
+                                         "Per-source outcomes of combined searches: ok, timed_out or failed",
+                                         ("source", "status"))
+FETCH_TOTAL = REGISTRY.counter("scraper_fetch_total", "Result pages served by each fetch path, with the reason for "
+                               "falling back to the browser", ("site", "path", "fallback"))
+EXTRACTIONS_TOTAL = REGISTRY.counter("scraper_extractions_total",
+                                     "Browser result pages by how their products were extracted", ("site", "method"))
+BROWSER_REQUESTS_TOTAL = REGISTRY.counter("scraper_browser_requests_total",
+                                          "Requests made by browser page loads, loaded or blocked by the browser profile",
+                                          ("site", "outcome"))
+BROWSER_BYTES_TOTAL = REGISTRY.counter("scraper_browser_bytes_total",
+                                       "Bytes transferred by browser page loads and estimated bytes avoided by blocking",
+                                       ("site", "kind"))
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a search query used for cache and de-duplication keys"""
+    return ' '.join(query.lower().split())
+
+
+class SearchCancelled(Exception):
+    """Raised inside a worker thread once the search it is serving has been cancelled"""
+
+
+def check_cancelled(cancelled: Optional[threading.Event]):
+    # Worker threads cannot be interrupted, so blocking browser work checks this token between steps
+    if cancelled is not None and cancelled.is_set():
+        raise SearchCancelled("search was cancelled")
+
+
+class DriverPool:
+    """Bounded, thread-safe pool of warm Selenium drivers shared by executor workers"""
+
+    def __init__(self, factory: Callable, size: int = 2, max_uses: int = 25, acquire_timeout: float = 120):
+        self.factory = factory
+        self.size = size
+        self.max_uses = max_uses
+        self.acquire_timeout = acquire_timeout
+
+        self._idle = queue.LifoQueue()  # Most recently used driver first, it has the warmest cache
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._uses = {}  # id(driver) -> number of searches served
+        self._closed = False
+
+        self.stats = {
+            'created': 0,
+            'recycled': 0,
+            'crashed': 0,
+            'acquired': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    def warm_up(self, count: Optional[int] = None):
+        """Start drivers ahead of time so the first searches skip the Chrome cold start"""
+        count = self.size if count is None else min(count, self.size)
+        while self._idle.qsize() < count and not self._closed:
+            driver = self._create_driver()
+            self._idle.put(driver)
+
+    def acquire(self, cancelled: Optional[threading.Event] = None):
+        """Borrow a driver, blocking until one of the pool slots is free or the search is cancelled"""
+        if self._closed:
+            raise RuntimeError("Driver pool has been shut down")
+
+        start = time.monotonic()
+        if not self._wait_for_slot(cancelled):
+            raise TimeoutException(f"No Selenium driver available after {self.acquire_timeout}s")
+        waited = time.monotonic() - start
+
+        with self._lock:
+            self.stats['acquired'] += 1
+            self.stats['wait_time_total'] += waited
+            self.stats['wait_time_max'] = max(self.stats['wait_time_max'], waited)
+
+        try:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                return self._create_driver()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, driver, broken: bool = False):
+        """Return a driver to the pool, recycling it if it crashed or has served enough searches"""
+        try:
+            with self._lock:
+                self._uses[id(driver)] = self._uses.get(id(driver), 0) + 1
+                worn_out = self._uses[id(driver)] >= self.max_uses
+
+            if broken:
+                with self._lock:
+                    self.stats['crashed'] += 1
+
+            if not broken and not worn_out and not self._closed:
+                try:
+                    self.reset_driver(driver)
+                    self._idle.put(driver)
+                    return
+                except WebDriverException as e:
+                    log_event(logger, logging.WARNING, "driver_reset_failed", error=str(e))
+
+            self._discard(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def driver(self, cancelled: Optional[threading.Event] = None):
+        """Context manager that borrows a driver and marks it broken if WebDriver errors escape"""
+        driver = self.acquire(cancelled)
+        broken = False
+        try:
+            yield driver
+        except TimeoutException:
+            # A page load timeout leaves a working browser; release() resets it away from the hung page
+            raise
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            self.release(driver, broken=broken)
+
+    def reset_driver(self, driver):
+        """Clear per-search state so the next borrower starts from a clean browser"""
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.delete_all_cookies()
+        driver.get("about:blank")
+
+    def shutdown(self):
+        """Quit every idle driver; drivers still in use are quit when they are released"""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(driver)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats['size'] = self.size
+        stats['idle'] = self._idle.qsize()
+        stats['wait_time_avg'] = stats['wait_time_total'] / stats['acquired'] if stats['acquired'] else 0.0
+        return stats
+
+    def _wait_for_slot(self, cancelled: Optional[threading.Event]) -> bool:
+        if cancelled is None:
+            return self._slots.acquire(timeout=self.acquire_timeout)
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self._slots.acquire(timeout=min(remaining, 0.25)):
+                return True
+            check_cancelled(cancelled)
+
+    def _create_driver(self):
+        driver = self.factory()
+        with self._lock:
+            self.stats['created'] += 1
+            self._uses[id(driver)] = 0
+        return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            self.stats['recycled'] += 1
+        self._quit(driver)
+
+    def _quit(self, driver):
+        with self._lock:
+            self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            log_event(logger, logging.WARNING, "driver_shutdown_failed", error=str(e))
+
+
+class SingleFlight:
+    """Shares one in-flight task between concurrent callers asking for the same key"""
+
+    def __init__(self):
+        self._tasks = {}
+        self._waiters = {}  # task -> number of callers awaiting it
+        self.stats = {'started': 0, 'coalesced': 0, 'abandoned': 0}
+
+    async def run(self, key, coroutine_factory: Callable):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coroutine_factory())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.stats['started'] += 1
+        else:
+            self.stats['coalesced'] += 1
+
+        # Shield the shared task so cancelling one waiter leaves the work running for the others
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # The last waiter was cancelled, so nobody is left to use the result. Forget the task
+                    # now so a caller arriving while it unwinds starts a fresh one instead of joining it
+                    if self._tasks.get(key) is task:
+                        del self._tasks[key]
+                    task.cancel()
+                    self.stats['abandoned'] += 1
+
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def _finished(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Mark the exception as retrieved in case every waiter was cancelled before it finished
+        if not task.cancelled():
+            task.exception()
+
+
+class PageReadiness:
+    """Waits for search results to render by polling the DOM instead of sleeping for fixed periods"""
+
+    # Returns the first selector with matches and its match count in a single WebDriver round trip
+    COUNT_SCRIPT = """
+        const selectors = arguments[0];
+        for (const selector of selectors) {
+            const count = document.querySelectorAll(selector).length;
+            if (count > 0) { return [selector, count]; }
+        }
+        return [null, 0];
+    """
+
+    # True once the page can no longer produce results: it finished loading or shows a no-results message
+    SETTLED_SCRIPT = """
+        const markers = arguments[0];
+        if (document.readyState === 'complete') { return true; }
+        const text = document.body ? document.body.textContent : '';
+        return markers.some(marker => text.includes(marker));
+    """
+
+    def __init__(self, container_selectors: List[str], target_count: int = 5, deadline: float = 15.0,
+                 poll_interval: float = 0.2, scroll_step: int = 800, max_scrolls: int = 6,
+                 settle_polls: int = 3, empty_markers: Iterable[str] = ()):
+        self.container_selectors = container_selectors
+        self.empty_markers = list(empty_markers)
+        self.target_count = target_count
+        self.deadline = deadline
+        self.poll_interval = poll_interval
+        self.scroll_step = scroll_step
+        self.max_scrolls = max_scrolls
+        self.settle_polls = settle_polls
+
+    def wait(self, driver, target_count: Optional[int] = None, cancelled: Optional[threading.Event] = None) -> Dict:
+        """Block until enough result containers are in the DOM, the deadline passes or the search is cancelled.
+
+        Returns the time actually spent in each phase along with the final container count.
+        """
+        target = self.target_count if target_count is None else target_count
+        started = time.monotonic()
+        deadline = started + self.deadline
+
+        def waiting():
+            return time.monotonic() < deadline and not (cancelled is not None and cancelled.is_set())
+
+        report = {'document': 0.0, 'containers': 0.0, 'scroll': 0.0, 'scrolls': 0,
+                  'count': 0, 'selector': None, 'timed_out': False, 'empty': False}
+
+        # Phase 1: wait for the document to be parsed
+        phase_start = time.monotonic()
+        while waiting():
+            if driver.execute_script("return document.readyState") in ("interactive", "complete"):
+                break
+            time.sleep(self.poll_interval)
+        report['document'] = time.monotonic() - phase_start
+
+        # Phase 2: wait for any of the result container selectors to match
+        phase_start = time.monotonic()
+        selector, count = None, 0
+        while waiting():
+            selector, count = driver.execute_script(self.COUNT_SCRIPT, self.container_selectors)
+            if count:
+                break
+            if driver.execute_script(self.SETTLED_SCRIPT, self.empty_markers):
+                # A genuine no-results page never matches a container, don't wait out the deadline
+                report['empty'] = True
+                break
+            time.sleep(self.poll_interval)
+        report['containers'] = time.monotonic() - phase_start
+
+        # Phase 3: scroll only while the result count is below target and still growing
+        phase_start = time.monotonic()
+        scrolls = 0
+        while count and count < target and scrolls < self.max_scrolls and waiting():
+            driver.execute_script("window.scrollTo(0, window.scrollY + arguments[0])", self.scroll_step)
+            scrolls += 1
+
+            previous = count
+            stalled_polls = 0
+            while stalled_polls < self.settle_polls and waiting():
+                time.sleep(self.poll_interval)
+                selector, count = driver.execute_script(self.COUNT_SCRIPT, self.container_selectors)
+                if count != previous:
+                    break
+                stalled_polls += 1
+
+            if count == previous:
+                # Nothing new appeared after scrolling, more scrolling will not help
+                break
+        report['scroll'] = time.monotonic() - phase_start
+
+        report['scrolls'] = scrolls
+        report['count'] = count
+        report['selector'] = selector
+        report['timed_out'] = time.monotonic() >= deadline
+        report['total'] = time.monotonic() - started
+        return report
+
+
+class DebugCapture:
+    """Bounded ring buffer of gzip-compressed pages kept for debugging instead of one overwritten file"""
+
+    def __init__(self, capacity: int = 20):
+        self._pages = deque(maxlen=capacity)
+
+    async def add(self, label: str, html_content: str):
+        # Compression is CPU work, keep it off the event loop
+        loop = asyncio.get_event_loop()
+        data = await loop.run_in_executor(None, gzip.compress, html_content.encode("utf-8"))
+        self._pages.append({'label': label, 'captured_at': time.time(),
+                            'size': len(html_content), 'data': data})
+
+    def pages(self) -> List[Dict]:
+        """Captured pages, oldest first, without their compressed payloads"""
+        return [{key: value for key, value in page.items() if key != 'data'} for page in self._pages]
+
+    def get_html(self, index: int = -1) -> str:
+        return gzip.decompress(self._pages[index]['data']).decode("utf-8")
+
+    def dump(self, directory: str) -> List[str]:
+        """Write every captured page to directory as .html.gz files and return their paths"""
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for page in list(self._pages):
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(page['captured_at']))
+            safe_label = ''.join(c if c.isalnum() else '_' for c in page['label'])[:60]
+            path = os.path.join(directory, f"{stamp}-{safe_label}.html.gz")
+            with open(path, "wb") as f:
+                f.write(page['data'])
+            paths.append(path)
+        return paths
+
+
+_worker_agents = {}
+
+
+def _parse_in_worker(agent_class, parser_name: str, html_content: str,
+                     limit: Optional[int]) -> Tuple[List[Product], Dict[str, float], float]:
+    """Entry point for process pool workers; each worker keeps one agent per class and parser"""
+    key = (agent_class, parser_name)
+    if key not in _worker_agents:
+        _worker_agents[key] = agent_class(parser=parser_name, selector_state_dir=None)
+    return _worker_agents[key].parse_timed(html_content, limit)
 
 
 class BaseAgent:
     """Base agent class with common functionality for all e-commerce agents"""
+
+    # Set by each site agent: container selectors and per-field selector chains
+    site = None
+    host = None
+    item_selectors = []
+    field_selectors = {}
+    # Typical number of results on one search page, used to decide how many pages to request
+    expected_page_size = 20
+    # Per-site browser rules: resource types the pages need and extra URL patterns never worth loading
+    browser_allow_types = ()
+    browser_deny_urls = ()
     
-    def __init__(self):
+    def __init__(self, pool_size: int = 2, max_driver_uses: int = 25, parser='lxml',
+                 selector_state_dir: Optional[str] = '.', parse_executor: str = 'thread',
+                 parse_workers: int = 2, capture_pages: int = 0, max_pages: int = 5,
+                 page_concurrency: int = 2, connection_limit: int = 20, connections_per_host: int = 8,
+                 dns_cache_ttl: int = 300, keepalive_timeout: float = 30, request_timeout: float = 30,
+                 browser_profile: Union[str, BrowserProfile] = 'lightweight', page_load_timeout: float = 30):
         self.user_agents = [
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:122.0) Gecko/20100101 Firefox/122.0'
         ]
+        self.pool_size = pool_size
+        self.max_driver_uses = max_driver_uses
+        self.browser_profile = get_browser_profile(browser_profile, self.browser_allow_types, self.browser_deny_urls)
+        self.browser_history = deque(maxlen=100)
+        # Bounds driver.get(), which otherwise blocks its worker thread for up to five minutes
+        self.page_load_timeout = page_load_timeout
+        self._driver_pool = None
+        self._driver_pool_lock = threading.Lock()
+        self.in_flight = SingleFlight()
+        self.parser: ParserBackend = get_parser_backend(parser)
+
+        # Selector chains are compiled once and reordered as the site layout reveals which selector wins
+        state_path = os.path.join(selector_state_dir, f"selectors_{self.site}.json") if selector_state_dir and self.site else None
+        self.selectors = SelectorEngine(self.site, self.parser, state_path=state_path)
+        self.selectors.register('item', self.item_selectors)
+        for field, selectors in self.field_selectors.items():
+            self.selectors.register(field, selectors)
+
+        # Parsing is CPU heavy; async agents hand it to a thread or process pool
+        if parse_executor not in ('thread', 'process'):
+            raise ValueError("parse_executor must be 'thread' or 'process'")
+        self.parse_executor_kind = parse_executor
+        self.parse_workers = parse_workers
+        self._parse_executor: Optional[Executor] = None
+
+        self.debug_capture = DebugCapture(capture_pages) if capture_pages else None
+        self._background_tasks = set()
+
+        # Deeper result sets fan out over several result pages, a few at a time per site
+        self.max_pages = max_pages
+        self.page_concurrency = page_concurrency
+
+        # Optional limiter with an async acquire(), awaited before every page request to this site
+        self.rate_limiter = None
+
+        # Long-lived HTTP session for sites, or fetch paths, that don't need a browser
+        self.connection_limit = connection_limit
+        self.connections_per_host = connections_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self):
+        """Open the long-lived HTTP session so searches reuse warm keep-alive connections"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                limit_per_host=self.connections_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+                enable_cleanup_closed=True
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+            )
+
+    async def close(self):
+        """Close the HTTP session and its pooled connections"""
+        session, self._session = self._session, None
+        if session is not None and not session.closed:
+            await session.close()
+        for task in list(self._background_tasks):
+            task.cancel()
+        self.shutdown_parse_executor()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        # Fall back to lazily opening the session when start() was not called
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    async def fetch_html(self, url: str, etag: Optional[str] = None,
+                         last_modified: Optional[str] = None) -> Tuple[int, Optional[str], Dict[str, str]]:
+        """GET url with browser headers and return (status, html, validators).
+
+        Passing the ETag or Last-Modified of an earlier response makes the request conditional; an
+        unchanged page then comes back as 304 with no body.
+        """
+        headers = self.get_browser_headers()
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        session = await self.get_session()
+        with self.stage('fetch'):
+            async with session.get(url, headers=headers) as response:
+                validators = {name: response.headers[name] for name in ('ETag', 'Last-Modified') if name in response.headers}
+                html_content = await response.text() if response.status == 200 else None
+                return response.status, html_content, validators
+
+    def get_browser_headers(self) -> Dict[str, str]:
+        # Custom headers to mimic a browser
+        return {
+            'User-Agent': random.choice(self.user_agents),
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1',
+            'Sec-Fetch-Dest': 'document',
+            'Sec-Fetch-Mode': 'navigate',
+            'Sec-Fetch-Site': 'none',
+            'Sec-Fetch-User': '?1',
+            'Pragma': 'no-cache',
+            'Cache-Control': 'no-cache',
+            'TE': 'trailers'
+        }
+
+    @property
+    def driver_pool(self) -> DriverPool:
+        """Lazily created pool of warm Selenium drivers for this agent"""
+        with self._driver_pool_lock:
+            if self._driver_pool is None:
+                self._driver_pool = DriverPool(self._start_driver, size=self.pool_size,
+                                               max_uses=self.max_driver_uses)
+            return self._driver_pool
+
+    def get_browser_stats(self) -> Dict:
+        """Requests and bytes per browser page load, and what the browser profile avoided"""
+        history = list(self.browser_history)
+        stats = {'profile': self.browser_profile.name, 'pages': len(history)}
+        if not history:
+            return stats
+        for key in ('requests', 'blocked', 'bytes', 'bytes_avoided'):
+            stats[f"{key}_per_page"] = sum(report[key] for report in history) / len(history)
+        blocked_by_type = {}
+        for report in history:
+            for kind, count in report['blocked_by_type'].items():
+                blocked_by_type[kind] = blocked_by_type.get(kind, 0) + count
+        stats['blocked_by_type'] = blocked_by_type
+        stats['last'] = history[-1]
+        return stats
+
+    def record_browser_page(self, driver):
+        """Collect the profile's network report for the page just loaded in driver"""
+        report = self.browser_profile.page_report(driver)
+        if report is None:
+            return
+        self.browser_history.append(report)
+        BROWSER_REQUESTS_TOTAL.inc(report['requests'], site=self.site, outcome='loaded')
+        BROWSER_REQUESTS_TOTAL.inc(report['blocked'], site=self.site, outcome='blocked')
+        BROWSER_BYTES_TOTAL.inc(report['bytes'], site=self.site, kind='transferred')
+        BROWSER_BYTES_TOTAL.inc(report['bytes_avoided'], site=self.site, kind='avoided_estimate')
+
+    def stage(self, stage: str):
+        """Context manager timing one pipeline stage of this site into scraper_stage_seconds"""
+        return STAGE_SECONDS.time(site=self.site, stage=stage)
+
+    def field_text(self, field: str, item, timings: Optional[Dict[str, float]] = None) -> Optional[str]:
+        """Stripped text of the first element matched by the field's selector chain"""
+        started = time.perf_counter() if timings is not None else None
+        element = self.selectors.select_one(field, item)
+        text = self.parser.text(element).strip() if element is not None else None
+        if timings is not None:
+            timings[field] = timings.get(field, 0.0) + time.perf_counter() - started
+        return text
+
+    async def search_products(self, search_query: str, max_results: int = 5) -> List[Product]:
+        """Search for up to max_results products, fetching further result pages as needed"""
+        # Concurrent identical searches share one fetch
+        with self.stage('search'):
+            return await self.in_flight.run((normalize_query(search_query), max_results),
+                                            lambda: self.collect_pages(search_query, max_results))
+
+    async def search_page(self, search_query: str, page: int, wanted: int) -> List[Product]:
+        """Fetch and parse one page of search results"""
+        raise NotImplementedError
+
+    async def collect_pages(self, search_query: str, max_results: int) -> List[Product]:
+        """Fetch result pages concurrently under page_concurrency until max_results unique products are found"""
+        pages = {}
+        running = {}
+        next_page = 1
+        exhausted = False
+        products = []
+        try:
+            while True:
+                # Only start another page while the pages in flight are unlikely to cover the request
+                while (not exhausted and next_page <= self.max_pages and len(running) < self.page_concurrency
+                       and len(products) + len(running) * self.expected_page_size < max_results):
+                    task = asyncio.ensure_future(self._throttled_page(search_query, next_page, max_results - len(products)))
+                    running[task] = next_page
+                    next_page += 1
+                if not running:
+                    break
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    page = running.pop(task)
+                    if task.exception() is not None:
+                        if page == 1:
+                            # Without the first page the search has no results at all; report it as failed
+                            raise task.exception()
+                        log_event(logger, logging.WARNING, "page_failed", site=self.site, page=page, error=str(task.exception()))
+                        pages[page] = []
+                    else:
+                        pages[page] = task.result()
+                    if not pages[page]:
+                        # An empty page means there are no further results
+                        exhausted = True
+
+                with self.stage('merge'):
+                    products = self.merge_pages(pages)
+                if len(products) >= max_results:
+                    break
+        finally:
+            for task in running:
+                task.cancel()
+
+        return products[:max_results]
+
+    async def _throttled_page(self, search_query: str, page: int, wanted: int) -> List[Product]:
+        if self.rate_limiter is not None:
+            with self.stage('rate_limit'):
+                await self.rate_limiter.acquire()
+        try:
+            products = await self.search_page(search_query, page, wanted)
+        except Exception:
+            PAGES_TOTAL.inc(site=self.site, outcome='error')
+            raise
+        PAGES_TOTAL.inc(site=self.site, outcome='ok' if products else 'empty')
+        return products
+
+    @staticmethod
+    def merge_pages(pages: Dict[int, List[Product]]) -> List[Product]:
+        """Products from the contiguous run of fetched pages, in page order, without duplicates"""
+        products = []
+        seen = set()
+        page = 1
+        while page in pages:
+            for product in pages[page]:
+                key = product.key()
+                if key not in seen:
+                    seen.add(key)
+                    products.append(product)
+            page += 1
+        return products
+
+    def parse_products(self, html_content: str, limit: Optional[int] = 5,
+                       timings: Optional[Dict[str, float]] = None) -> List[Product]:
+        raise NotImplementedError
+
+    async def parse_offloaded(self, html_content: str, limit: Optional[int] = 5) -> List[Product]:
+        """Run parse_products in the parse pool so the event loop stays responsive.
+
+        In process mode each worker counts selector hits on its own; the agent's
+        SelectorEngine statistics only cover thread mode and synchronous parses.
+        """
+        loop = asyncio.get_event_loop()
+        executor = self._get_parse_executor()
+        if self.parse_executor_kind == 'process':
+            parsed = await loop.run_in_executor(executor, _parse_in_worker, type(self), self.parser.name,
+                                                html_content, limit)
+        else:
+            parsed = await loop.run_in_executor(executor, self.parse_timed, html_content, limit)
+        return self.record_parse(*parsed)
+
+    def parse_timed(self, html_content: str, limit: Optional[int] = 5) -> Tuple[List[Product], Dict[str, float], float]:
+        """parse_products plus its per-field timings and total duration, for recording in the calling process"""
+        timings = {}
+        started = time.perf_counter()
+        products = self.parse_products(html_content, limit, timings=timings)
+        return products, timings, time.perf_counter() - started
+
+    def record_parse(self, products: List[Product], timings: Dict[str, float], elapsed: float) -> List[Product]:
+        STAGE_SECONDS.observe(elapsed, site=self.site, stage='parse')
+        for field, seconds in timings.items():
+            FIELD_SECONDS.observe(seconds, site=self.site, field=field)
+        PRODUCTS_TOTAL.inc(len(products), site=self.site)
+        return products
+
+    def capture_page(self, label: str, html_content: str):
+        """Store a copy of a fetched page in the debug ring buffer without waiting for it"""
+        if self.debug_capture is None:
+            return
+        task = asyncio.ensure_future(self.debug_capture.add(label, html_content))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def shutdown_parse_executor(self):
+        executor, self._parse_executor = self._parse_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _get_parse_executor(self) -> Executor:
+        if self._parse_executor is None:
+            if self.parse_executor_kind == 'process':
+                self._parse_executor = ProcessPoolExecutor(max_workers=self.parse_workers)
+            else:
+                self._parse_executor = ThreadPoolExecutor(max_workers=self.parse_workers,
+                                                          thread_name_prefix=f"{self.site}-parse")
+        return self._parse_executor
+
+    def shutdown_driver_pool(self):
+        with self._driver_pool_lock:
+            pool, self._driver_pool = self._driver_pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def _start_driver(self):
+        with self.stage('driver_start'):
+            return self.setup_selenium_driver()
 
     def setup_selenium_driver(self):
         chrome_options = Options()
@@ -36,9 +755,12 @@ class BaseAgent:
         
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option("useAutomationExtension", False)
+        self.browser_profile.apply_options(chrome_options)
         
         driver = webdriver.Chrome(options=chrome_options)
         driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        self.browser_profile.apply_driver(driver)
+        driver.set_page_load_timeout(self.page_load_timeout)
         return driver
 
     def get_headers(self):
@@ -54,403 +776,949 @@ class BaseAgent:
 
 class AmazonAgent(BaseAgent):
     """Agent specifically designed for Amazon product searches"""
+
+    site = 'amazon'
+    host = 'www.amazon.in'
+    expected_page_size = 16
+
+    # Multiple selector patterns for product containers
+    item_selectors = [
+        'div.s-result-item[data-component-type="s-search-result"]',
+        'div.sg-col-4-of-12',
+        'div.s-asin',
+        'div[data-asin]:not([data-asin=""])'
+    ]
+
+    # Multiple selector patterns for each field
+    field_selectors = {
+        'name': [
+            'h2 .a-link-normal',
+            'h2 span.a-text-normal',
+            '.a-size-medium.a-text-normal',
+            '[data-cy="title-recipe"]',
+            'h2 a span',
+            '.a-size-base-plus.a-color-base.a-text-normal'
+        ],
+        'price': [
+            '.a-price .a-offscreen',
+            '.a-price-whole',
+            'span.a-price',
+            '[data-cy="price-recipe"]',
+            'span.a-color-base span.a-color-price'
+        ],
+        'rating': [
+            '.a-icon-star-small .a-icon-alt',
+            '.a-icon-star .a-icon-alt',
+            '[data-cy="rating-recipe"]',
+            'i.a-icon.a-icon-star-small span',
+            'i.a-icon.a-icon-star span'
+        ],
+        'reviews': [
+            'span[aria-label*="stars"] + span',
+            '.a-size-base.s-underline-text',
+            '[data-cy="review-count-recipe"]'
+        ]
+    }
+
+    # Markers of the pages Amazon serves to suspected bots instead of results
+    captcha_markers = ('/errors/validateCaptcha', 'Enter the characters you see below',
+                       'Type the characters you see in this image')
+    block_markers = ('api-services-support@amazon.com', 'To discuss automated access to Amazon data')
+    # A genuine empty search, which the browser would not improve on
+    no_results_markers = ('No results for', 'did not match any products')
+
+    # Listings come from the HTML; product images and Amazon's own ad and metrics beacons are not needed
+    browser_deny_urls = ('*m.media-amazon.com/images/I/*', '*amazon-adsystem.com*', '*fls-eu.amazon.*',
+                         '*unagi.amazon.*', '*aax-eu.amazon.*')
+
+    # Applies the item and field selector chains inside the page and returns only the extracted text,
+    # with the selector that matched each field so the selector statistics stay current
+    EXTRACT_SCRIPT = """
+        const [itemSelectors, fieldSelectors, limit] = arguments;
+        let items = [];
+        let itemSelector = null;
+        for (const selector of itemSelectors) {
+            items = document.querySelectorAll(selector);
+            if (items.length) { itemSelector = selector; break; }
+        }
+        const records = [];
+        for (const item of Array.from(items).slice(0, limit === null ? items.length : limit)) {
+            const record = {asin: item.getAttribute('data-asin'), fields: {}, winners: {}};
+            for (const [field, selectors] of Object.entries(fieldSelectors)) {
+                record.fields[field] = null;
+                record.winners[field] = null;
+                for (const selector of selectors) {
+                    const element = item.querySelector(selector);
+                    if (element) {
+                        record.fields[field] = element.textContent.trim();
+                        record.winners[field] = selector;
+                        break;
+                    }
+                }
+            }
+            records.push(record);
+        }
+        return {itemSelector: itemSelector, records: records};
+    """
+
+    def __init__(self, *args, fetch_mode: str = 'auto', block_cooldown: float = 300, extraction: str = 'script',
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        if fetch_mode not in ('auto', 'http', 'browser'):
+            raise ValueError("fetch_mode must be 'auto', 'http' or 'browser'")
+        if extraction not in ('script', 'page_source'):
+            raise ValueError("extraction must be 'script' or 'page_source'")
+        # 'script' extracts products inside the browser, 'page_source' always transfers and parses the full DOM
+        self.extraction = extraction
+        self.readiness = PageReadiness(self.item_selectors, empty_markers=self.no_results_markers)
+        self.readiness_history = deque(maxlen=100)
+
+        # 'auto' tries a plain HTTP request first and only loads the page in Chrome when that is blocked
+        self.fetch_mode = fetch_mode
+        self.block_cooldown = block_cooldown
+        self.fetch_history = deque(maxlen=100)
+        self._http_paused_until = 0.0
+
+    def get_readiness_stats(self) -> Dict:
+        """Average and most recent time spent waiting in each readiness phase"""
+        history = list(self.readiness_history)
+        if not history:
+            return {'searches': 0}
+        phases = ['document', 'containers', 'scroll', 'total']
+        return {
+            'searches': len(history),
+            'average': {phase: sum(r[phase] for r in history) / len(history) for phase in phases},
+            'timed_out': sum(1 for r in history if r['timed_out']),
+            'last': history[-1],
+        }
     
-    async def search_products(self, search_query: str) -> List[Dict]:
-        """Search for products on Amazon"""
+    def get_fetch_stats(self) -> Dict:
+        """Which path served recent result pages, why the browser was needed and how long each path took"""
+        history = list(self.fetch_history)
+        stats = {'mode': self.fetch_mode, 'pages': len(history),
+                 'http_paused_for': max(0.0, self._http_paused_until - time.monotonic())}
+        for path in ('http', 'browser'):
+            served = [entry for entry in history if entry['path'] == path]
+            stats[path] = {'pages': len(served),
+                           'average': sum(entry['seconds'] for entry in served) / len(served) if served else 0.0}
+        fallbacks = {}
+        for entry in history:
+            if entry['fallback'] is not None:
+                fallbacks[entry['fallback']] = fallbacks.get(entry['fallback'], 0) + 1
+        stats['fallbacks'] = fallbacks
+        stats['recent'] = history[-10:]
+        return stats
+
+    def block_reason(self, status: int, html_content: Optional[str]) -> Optional[str]:
+        """Why an HTTP response is not a usable results page, or None if it is one"""
+        if status != 200 or not html_content:
+            return f"http_{status}"
+        if any(marker in html_content for marker in self.captcha_markers):
+            return 'captcha'
+        if any(marker in html_content for marker in self.block_markers):
+            return 'blocked'
+        if 'data-asin' not in html_content and not self.is_no_results(html_content):
+            # A results shell without any listings, e.g. when results are rendered by script
+            return 'empty'
+        return None
+
+    def is_no_results(self, html_content: str) -> bool:
+        return any(marker in html_content for marker in self.no_results_markers)
+
+    async def search_page(self, search_query: str, page: int, wanted: int) -> List[Product]:
+        """Search for products on Amazon, over HTTP when possible and in Chrome otherwise"""
+        started = time.perf_counter()
+        fallback = None
+        if self.fetch_mode == 'http' or (self.fetch_mode == 'auto' and time.monotonic() >= self._http_paused_until):
+            products, fallback = await self._search_page_http(search_query, page)
+            if fallback is None or self.fetch_mode == 'http':
+                self._record_fetch(search_query, page, 'http', fallback, started)
+                if fallback is not None:
+                    raise RuntimeError(f"Amazon HTTP fetch failed: {fallback}")
+                return products
+            if fallback in ('captcha', 'blocked'):
+                # Further requests would hit the same wall; go straight to the browser for a while
+                self._http_paused_until = time.monotonic() + self.block_cooldown
+            log_event(logger, logging.INFO, "http_fallback", site=self.site, page=page, reason=fallback)
+        elif self.fetch_mode == 'auto':
+            fallback = 'paused'
+
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._search_products_sync, search_query)
-        
-    def _search_products_sync(self, search_query: str) -> List[Dict]:
+        cancelled = threading.Event()
+        try:
+            products = await loop.run_in_executor(None, self._search_products_sync, search_query, page, wanted,
+                                                  cancelled)
+        except asyncio.CancelledError:
+            # The worker stops at its next check and hands the driver back to the pool, which resets it
+            cancelled.set()
+            raise
+        self._record_fetch(search_query, page, 'browser', fallback, started)
+        return products
+
+    async def _search_page_http(self, search_query: str, page: int) -> Tuple[List[Product], Optional[str]]:
+        """Products from a plain HTTP fetch, or no products and the reason the page can't be used"""
+        try:
+            status, html_content, _ = await self.fetch_html(self.search_url(search_query, page))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log_event(logger, logging.WARNING, "page_request_failed", site=self.site, page=page, error=str(e))
+            return [], 'http_error'
+        reason = self.block_reason(status, html_content)
+        if reason is not None:
+            return [], reason
+
+        self.capture_page(search_query, html_content)
+        products = await self.parse_offloaded(html_content, limit=None)
+        if not products and not self.is_no_results(html_content):
+            return [], 'no_products'
+        return products, None
+
+    def _record_fetch(self, search_query: str, page: int, path: str, fallback: Optional[str], started: float):
+        FETCH_TOTAL.inc(site=self.site, path=path, fallback=fallback or 'none')
+        self.fetch_history.append({'query': search_query, 'page': page, 'path': path, 'fallback': fallback,
+                                   'seconds': round(time.perf_counter() - started, 3)})
+
+
+    def _search_products_sync(self, search_query: str, page: int = 1, wanted: int = 5,
+                              cancelled: Optional[threading.Event] = None) -> List[Product]:
         """Synchronous version of Amazon scraper to be run in a thread via run_in_executor"""
-        driver = self.setup_selenium_driver()
-        products = []
-        
+        if self.extraction == 'page_source':
+            html_content = self.fetch_search_html(search_query, page, wanted, cancelled)
+            EXTRACTIONS_TOTAL.inc(site=self.site, method='page_source')
+            return self.record_parse(*self.parse_timed(html_content, limit=None))
+
+        with self._search_page_driver(search_query, page, wanted, cancelled) as driver:
+            products = self.extract_in_browser(driver, limit=None)
+            if products:
+                EXTRACTIONS_TOTAL.inc(site=self.site, method='script')
+                return products
+
+            # Nothing matched in the live DOM, parse the serialized page like the page_source mode does
+            log_event(logger, logging.INFO, "script_extraction_empty", site=self.site, page=page)
+            EXTRACTIONS_TOTAL.inc(site=self.site, method='page_source_fallback')
+            check_cancelled(cancelled)
+            with self.stage('page_source'):
+                html_content = driver.page_source
+        return self.record_parse(*self.parse_timed(html_content, limit=None))
+
+    def extract_in_browser(self, driver, limit: Optional[int] = 5) -> List[Product]:
+        """Products extracted by EXTRACT_SCRIPT inside the loaded page, empty if the script found none or failed"""
+        field_selectors = {field: self.selectors.order(field) for field in self.field_selectors}
         try:
-            print("Accessing Amazon...")
-            driver.get(f"https://www.amazon.in/s?k={search_query.replace(' ', '+')}")
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-            
-            # Give the page time to fully load
-            time.sleep(3)
-            
-            # Scroll to load more products
-            print("Scrolling page...")
-            for _ in range(2):
-                driver.execute_script("window.scrollTo(0, window.scrollY + 800)")
-                time.sleep(1.5)
-            
-            # Parse products
-            print("Parsing Amazon products...")
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
-            
-            # Multiple selector patterns for product containers
-            item_selectors = [
-                'div.s-result-item[data-component-type="s-search-result"]',
-                'div.sg-col-4-of-12',
-                'div.s-asin',
-                'div[data-asin]:not([data-asin=""])'
-            ]
-            
-            # Try each selector pattern until we find products
-            items = []
-            for selector in item_selectors:
-                items = soup.select(selector)
-                if items:
-                    print(f"Found {len(items)} products using selector: {selector}")
-                    break
+            with self.stage('extract_script'):
+                result = driver.execute_script(self.EXTRACT_SCRIPT, self.selectors.order('item'), field_selectors, limit)
+        except JavascriptException as e:
+            log_event(logger, logging.WARNING, "script_extraction_failed", site=self.site, error=str(e))
+            return []
+        if not result or not result['itemSelector']:
+            return []
+
+        self.selectors.record('item', result['itemSelector'])
+        products = []
+        for record in result['records']:
+            for field, winner in record['winners'].items():
+                self.selectors.record(field, winner)
+            fields = record['fields']
+            # Only add products with at least a name
+            if fields.get('name'):
+                products.append(Product.create(
+                    name=fields['name'],
+                    price=fields.get('price'),
+                    rating=fields.get('rating'),
+                    reviews=fields.get('reviews'),
+                    source='Amazon',
+                    product_id=record['asin'] or None
+                ))
+        PRODUCTS_TOTAL.inc(len(products), site=self.site)
+        return products
+
+    @staticmethod
+    def search_url(search_query: str, page: int = 1) -> str:
+        return f"https://www.amazon.in/s?k={search_query.replace(' ', '+')}&page={page}"
+
+    def fetch_search_html(self, search_query: str, page: int = 1, wanted: int = 5,
+                          cancelled: Optional[threading.Event] = None) -> str:
+        """Load one search results page in a pooled browser and return its rendered HTML"""
+        with self._search_page_driver(search_query, page, wanted, cancelled) as driver:
+            check_cancelled(cancelled)
+            with self.stage('page_source'):
+                return driver.page_source
+
+    @contextmanager
+    def _search_page_driver(self, search_query: str, page: int, wanted: int,
+                            cancelled: Optional[threading.Event] = None):
+        """Borrow a pooled driver with one search results page loaded and rendered in it"""
+        # Acquiring includes starting Chrome when no warm driver is idle, which is also timed as driver_start
+        acquire_started = time.perf_counter()
+        with self.driver_pool.driver(cancelled) as driver:
+            STAGE_SECONDS.observe(time.perf_counter() - acquire_started, site=self.site, stage='driver_acquire')
+            check_cancelled(cancelled)
+            self.browser_profile.begin_page(driver)
+            with self.stage('navigation'):
+                driver.get(self.search_url(search_query, page))
+            check_cancelled(cancelled)
             
-            for item in items[:5]:  # Get first 5 products
-                try:
-                    # Multiple selector patterns for each field
-                    name_selectors = [
-                        'h2 .a-link-normal',
-                        'h2 span.a-text-normal',
-                        '.a-size-medium.a-text-normal',
-                        '[data-cy="title-recipe"]',
-                        'h2 a span',
-                        '.a-size-base-plus.a-color-base.a-text-normal'
-                    ]
-                    
-                    price_selectors = [
-                        '.a-price .a-offscreen',
-                        '.a-price-whole',
-                        'span.a-price',
-                        '[data-cy="price-recipe"]',
-                        'span.a-color-base span.a-color-price'
-                    ]
-                    
-                    rating_selectors = [
-                        '.a-icon-star-small .a-icon-alt',
-                        '.a-icon-star .a-icon-alt',
-                        '[data-cy="rating-recipe"]',
-                        'i.a-icon.a-icon-star-small span',
-                        'i.a-icon.a-icon-star span'
-                    ]
-                    
-                    review_selectors = [
-                        'span[aria-label*="stars"] + span',
-                        '.a-size-base.s-underline-text',
-                        '[data-cy="review-count-recipe"]'
-                    ]
-                    
-                    # Try different selectors for each field
-                    name = None
-                    for selector in name_selectors:
-                        name_elem = item.select_one(selector)
-                        if name_elem:
-                            name = name_elem.text.strip()
-                            break
-                    
-                    price = None
-                    for selector in price_selectors:
-                        price_elem = item.select_one(selector)
-                        if price_elem:
-                            price = price_elem.text.strip()
-                            break
-                    
-                    rating = None
-                    for selector in rating_selectors:
-                        rating_elem = item.select_one(selector)
-                        if rating_elem:
-                            rating = rating_elem.text.strip()
-                            break
-                    
-                    reviews = None
-                    for selector in review_selectors:
-                        reviews_elem = item.select_one(selector)
-                        if reviews_elem:
-                            reviews = reviews_elem.text.strip()
-                            break
-                    
-                    # Only add products with at least a name
-                    if name:
-                        print(f"Found Amazon product: {name[:50]}...")
-                        products.append({
-                            'name': name,
-                            'price': price if price else "Not available",
-                            'rating': rating if rating else "No rating",
-                            'reviews': reviews if reviews else "No reviews",
-                            'source': 'Amazon'
-                        })
-                except Exception as e:
-                    print(f"Error parsing individual Amazon product: {str(e)}")
-                    continue
-                    
-        finally:
-            driver.quit()
+            # Wait until the result containers are rendered, scrolling only while more keep loading
+            readiness = self.readiness.wait(driver, target_count=wanted, cancelled=cancelled)
+            check_cancelled(cancelled)
+            self.readiness_history.append(readiness)
+            for phase in ('document', 'containers', 'scroll'):
+                STAGE_SECONDS.observe(readiness[phase], site=self.site, stage=f"wait_{phase}")
+            log_event(logger, logging.INFO, "page_ready", site=self.site, page=page, seconds=round(readiness['total'], 3),
+                      results=readiness['count'], timed_out=readiness['timed_out'])
+
+            yield driver
+            self.record_browser_page(driver)
+
+    def fetch_url_html(self, url: str) -> str:
+        """Load any Amazon page, e.g. a product page, in a pooled browser and return its HTML"""
+        with self.driver_pool.driver() as driver:
+            self.browser_profile.begin_page(driver)
+            driver.get(url)
+            html_content = driver.page_source
+            self.record_browser_page(driver)
+            return html_content
+
+    def parse_products(self, html_content: str, limit: Optional[int] = 5,
+                       timings: Optional[Dict[str, float]] = None) -> List[Product]:
+        """Extract products from a raw Amazon search results page.
+
+        When ``timings`` is given, seconds spent per field are accumulated into it.
+        """
+        products = []
+        soup = self.parser.parse(html_content, self.item_selectors)
+        
+        # Try each selector pattern until we find products
+        items, selector = self.selectors.select_all('item', soup)
+        if items:
+            log_event(logger, logging.DEBUG, "items_matched", site=self.site, count=len(items), selector=selector)
+
+        if not items and self.parser.supports_partial:
+            # Nothing matched in the partial tree, retry against the full document
+            soup = self.parser.parse(html_content)
+            items, selector = self.selectors.select_all('item', soup)
+        
+        for item in items[:limit]:
+            try:
+                # Try each field's selector chain in declared order
+                name = self.field_text('name', item, timings)
+                price = self.field_text('price', item, timings)
+                rating = self.field_text('rating', item, timings)
+                reviews = self.field_text('reviews', item, timings)
+                
+                # Only add products with at least a name
+                if name:
+                    log_event(logger, logging.DEBUG, "product_extracted", site=self.site, name=name[:50])
+                    products.append(Product.create(
+                        name=name,
+                        price=price,
+                        rating=rating,
+                        reviews=reviews,
+                        source='Amazon',
+                        product_id=self.parser.attr(item, 'data-asin') or None
+                    ))
+            except Exception as e:
+                log_event(logger, logging.WARNING, "product_parse_failed", site=self.site, error=str(e))
+                continue
             
         return products
 
 
 class FlipkartAgent(BaseAgent):
     """Agent specifically designed for Flipkart product searches"""
-    
-    async def search_products(self, search_query: str) -> List[Dict]:
-        """Scrape Flipkart products using direct HTTP requests"""
+
+    site = 'flipkart'
+    host = 'www.flipkart.com'
+    expected_page_size = 24
+
+    # Multiple selector patterns for product containers
+    item_selectors = [
+        'div._1YokD2._3Mn1Gg div._1AtVbE',
+        'div._4ddWXP',
+        'div._2kHMtA',
+        'div.CXW8mj',
+        'div._1xHGtK._373qXS',
+        'div[data-id]'
+    ]
+
+    # Extract product information using various selectors
+    field_selectors = {
+        'name': [
+            'div._4rR01T', 'a.s1Q9rs', 'a.IRpwTa', '._2WkVRV',
+            '.B_NuCI', '.Bv11UC', 'a[title]'
+        ],
+        'price': [
+            'div._30jeq3', 'div._3I9_wc', '._25b18c',
+            '._30jeq3._1_WHN1', '.PEDQHg'
+        ],
+        'rating': [
+            'div._3LWZlK', 'div.gUuXy-', '.hGSR34',
+            '._1lRcqv ._3LWZlK', 'span[id*="productRating"]'
+        ],
+        'reviews': [
+            'span._2_R_DZ', 'span._13vcmD', '._1lRcqv',
+            'span[class*="review"]', '._2_R_DZ span'
+        ]
+    }
+
+    @staticmethod
+    def search_url(search_query: str, page: int = 1) -> str:
+        return f"https://www.flipkart.com/search?q={search_query.replace(' ', '+')}&page={page}"
+
+    async def search_page(self, search_query: str, page: int, wanted: int) -> List[Product]:
+        """Scrape Flipkart products using direct HTTP requests; fetch errors propagate to collect_pages"""
+        # Make the HTTP request
+        search_url = self.search_url(search_query, page)
+        log_event(logger, logging.DEBUG, "page_request", site=self.site, url=search_url)
+        status, html_content, _ = await self.fetch_html(search_url)
+        if status != 200:
+            log_event(logger, logging.WARNING, "page_http_error", site=self.site, page=page, status=status)
+            raise RuntimeError(f"Flipkart returned HTTP {status}")
+
+        # Keep a compressed copy for debugging when capture is enabled
+        self.capture_page(search_query, html_content)
+
+        return await self.parse_offloaded(html_content, limit=None)
+
+    def parse_products(self, html_content: str, limit: Optional[int] = 5,
+                       timings: Optional[Dict[str, float]] = None) -> List[Product]:
+        """Extract products from a raw Flipkart search results page.
+
+        When ``timings`` is given, seconds spent per field are accumulated into it.
+        """
         products = []
         
-        try:
-            print("Accessing Flipkart using direct HTTP request...")
-            
-            # Format the search URL
-            search_url = f"https://www.flipkart.com/search?q={search_query.replace(' ', '+')}"
-            
-            # Create a session with custom headers to mimic a browser
-            headers = {
-                'User-Agent': random.choice(self.user_agents),
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-                'Sec-Fetch-Dest': 'document',
-                'Sec-Fetch-Mode': 'navigate',
-                'Sec-Fetch-Site': 'none',
-                'Sec-Fetch-User': '?1',
-                'Pragma': 'no-cache',
-                'Cache-Control': 'no-cache',
-                'TE': 'trailers'
-            }
+        # Parse the HTML, keeping only the result containers when the backend supports it
+        soup = self.parser.parse(html_content, self.item_selectors)
+        
+        # Try each selector until we find products, requiring more than just headers
+        items, selector = self.selectors.select_all('item', soup, min_count=3)
+        if selector:
+            log_event(logger, logging.DEBUG, "items_matched", site=self.site, count=len(items), selector=selector)
+        
+        # If standard selectors fail, try looking for typical product patterns
+        if not items or len(items) <= 2:
+            log_event(logger, logging.INFO, "item_selectors_missed", site=self.site, fallback="price_parents")
+
+            # The alternative approach walks up from prices, which needs the full document
+            if self.parser.supports_partial:
+                soup = self.parser.parse(html_content)
             
-            # Make the HTTP request
-            async with aiohttp.ClientSession() as session:
-                print(f"Sending request to: {search_url}")
-                async with session.get(search_url, headers=headers, timeout=30) as response:
-                    if response.status == 200:
-                        print("Successfully received response from Flipkart")
-                        html_content = await response.text()
-                        
-                        # Parse the HTML
-                        soup = BeautifulSoup(html_content, 'html.parser')
-                        
-                        # Save the HTML for debugging (optional)
-                        with open("flipkart_direct_response.html", "w", encoding="utf-8") as f:
-                            f.write(html_content)
-                        
-                        # Multiple selector patterns for product containers
-                        item_selectors = [
-                            'div._1YokD2._3Mn1Gg div._1AtVbE',
-                            'div._4ddWXP',
-                            'div._2kHMtA',
-                            'div.CXW8mj',
-                            'div._1xHGtK._373qXS',
-                            'div[data-id]'
-                        ]
-                        
-                        # Try each selector until we find products
-                        items = []
-                        for selector in item_selectors:
-                            items = soup.select(selector)
-                            if items and len(items) > 2:  # Ensure we have actual products (more than just headers)
-                                print(f"Found {len(items)} products using selector: {selector}")
-                                break
-                        
-                        # If standard selectors fail, try looking for typical product patterns
-                        if not items or len(items) <= 2:
-                            print("Standard selectors didn't work, trying alternative approach...")
-                            
-                            # Look for elements with price class
-                            price_elements = soup.select('div._30jeq3')
-                            
-                            if price_elements:
-                                print(f"Found {len(price_elements)} price elements, using parent elements as products")
-                                
-                                # For each price, get its parent or grandparent as a product container
-                                for price_elem in price_elements[:10]:  # Limit to first 10
-                                    # Navigate up to potential product container
-                                    parent = price_elem.parent
-                                    grandparent = parent.parent if parent else None
-                                    great_grandparent = grandparent.parent if grandparent else None
-                                    
-                                    # Choose the most likely product container
-                                    product_container = None
-                                    for container in [great_grandparent, grandparent, parent]:
-                                        if container and len(container.get_text(strip=True)) > 20:
-                                            product_container = container
-                                            break
-                                    
-                                    if product_container:
-                                        items.append(product_container)
-                        
-                        # Process products
-                        for item in items[:5]:  # Get first 5 products
-                            try:
-                                # Extract product information using various selectors
-                                name_selectors = [
-                                    'div._4rR01T', 'a.s1Q9rs', 'a.IRpwTa', '._2WkVRV',
-                                    '.B_NuCI', '.Bv11UC', 'a[title]'
-                                ]
-                                
-                                price_selectors = [
-                                    'div._30jeq3', 'div._3I9_wc', '._25b18c',
-                                    '._30jeq3._1_WHN1', '.PEDQHg'
-                                ]
-                                
-                                rating_selectors = [
-                                    'div._3LWZlK', 'div.gUuXy-', '.hGSR34',
-                                    '._1lRcqv ._3LWZlK', 'span[id*="productRating"]'
-                                ]
-                                
-                                review_selectors = [
-                                    'span._2_R_DZ', 'span._13vcmD', '._1lRcqv',
-                                    'span[class*="review"]', '._2_R_DZ span'
-                                ]
-                                
-                                # Extract data using selectors
-                                name = None
-                                for selector in name_selectors:
-                                    name_elem = item.select_one(selector)
-                                    if name_elem:
-                                        name = name_elem.text.strip()
-                                        break
-                                
-                                price = None
-                                for selector in price_selectors:
-                                    price_elem = item.select_one(selector)
-                                    if price_elem:
-                                        price = price_elem.text.strip()
-                                        break
-                                
-                                rating = None
-                                for selector in rating_selectors:
-                                    rating_elem = item.select_one(selector)
-                                    if rating_elem:
-                                        rating = rating_elem.text.strip()
-                                        break
-                                
-                                reviews = None
-                                for selector in review_selectors:
-                                    reviews_elem = item.select_one(selector)
-                                    if reviews_elem:
-                                        reviews = reviews_elem.text.strip()
-                                        break
-                                
-                                # Extract link if available
-                                link = None
-                                link_elem = item.select_one('a[href]')
-                                if link_elem and 'href' in link_elem.attrs:
-                                    link = 'https://www.flipkart.com' + link_elem['href'] if not link_elem['href'].startswith('http') else link_elem['href']
-                                
-                                # Extract image if available
-                                image = None
-                                img_elem = item.select_one('img[src]')
-                                if img_elem and 'src' in img_elem.attrs:
-                                    image = img_elem['src']
-                                
-                                # Fall back to raw text if structured extraction fails
-                                if not name and not price:
-                                    all_text = item.get_text(separator=' ', strip=True)
-                                    if all_text:
-                                        # Use raw text and try to identify price pattern
-                                        name = all_text[:100] + "..." if len(all_text) > 100 else all_text
-                                        # Look for price pattern (₹ followed by digits)
-                                        import re
-                                        price_match = re.search(r'₹[\d,]+', all_text)
-                                        price = price_match.group(0) if price_match else "Not identified"
-                                
-                                # Only add products with at least some information
-                                if name or price:
-                                    print(f"Found Flipkart product: {name[:50] if name else 'Unknown'}...")
-                                    products.append({
-                                        'name': name if name else "Unknown Product",
-                                        'price': price if price else "Not available",
-                                        'rating': f"{rating} stars" if rating else "No rating",
-                                        'reviews': reviews if reviews else "No reviews",
-                                        'source': 'Flipkart',
-                                        'link': link,
-                                        'image': image
-                                    })
-                            except Exception as e:
-                                print(f"Error parsing individual Flipkart product: {str(e)}")
-                                continue
-                    else:
-                        print(f"Failed to get Flipkart search results. Status code: {response.status}")
-                        
-        except Exception as e:
-            print(f"Error during Flipkart HTTP request: {str(e)}")
+            # Look for elements with price class
+            price_elements = self.parser.select(soup, 'div._30jeq3')
             
+            if price_elements:
+                log_event(logger, logging.DEBUG, "price_parents_found", site=self.site, count=len(price_elements))
+                
+                # For each price, get its parent or grandparent as a product container
+                for price_elem in price_elements[:10]:  # Limit to first 10
+                    # Navigate up to potential product container
+                    parent = self.parser.parent(price_elem)
+                    grandparent = self.parser.parent(parent) if parent else None
+                    great_grandparent = self.parser.parent(grandparent) if grandparent else None
+                    
+                    # Choose the most likely product container
+                    product_container = None
+                    for container in [great_grandparent, grandparent, parent]:
+                        if container and len(self.parser.get_text(container, strip=True)) > 20:
+                            product_container = container
+                            break
+                    
+                    if product_container:
+                        items.append(product_container)
+        
+        # Process products
+        for item in items[:limit]:
+            try:
+                # Extract data using each field's selector chain
+                name = self.field_text('name', item, timings)
+                price = self.field_text('price', item, timings)
+                rating = self.field_text('rating', item, timings)
+                reviews = self.field_text('reviews', item, timings)
+                
+                # Flipkart's product id sits on the tile itself or on a wrapper inside the row
+                product_id = self.parser.attr(item, 'data-id')
+                if product_id is None:
+                    id_elem = self.parser.select_one(item, '[data-id]')
+                    product_id = self.parser.attr(id_elem, 'data-id') if id_elem is not None else None
+                
+                # Extract link if available
+                link = None
+                link_elem = self.parser.select_one(item, 'a[href]')
+                href = self.parser.attr(link_elem, 'href') if link_elem else None
+                if href is not None:
+                    link = 'https://www.flipkart.com' + href if not href.startswith('http') else href
+                
+                # Extract image if available
+                image = None
+                img_elem = self.parser.select_one(item, 'img[src]')
+                if img_elem and self.parser.attr(img_elem, 'src') is not None:
+                    image = self.parser.attr(img_elem, 'src')
+                
+                # Fall back to raw text if structured extraction fails
+                if not name and not price:
+                    all_text = self.parser.get_text(item, separator=' ', strip=True)
+                    if all_text:
+                        # Use raw text and try to identify price pattern
+                        name = all_text[:100] + "..." if len(all_text) > 100 else all_text
+                        # Look for price pattern (₹ followed by digits)
+                        price_match = RUPEE_PRICE_PATTERN.search(all_text)
+                        price = price_match.group(0) if price_match else "Not identified"
+                
+                # Only add products with at least some information
+                if name or price:
+                    log_event(logger, logging.DEBUG, "product_extracted", site=self.site, name=name[:50] if name else None)
+                    products.append(Product.create(
+                        name=name if name else "Unknown Product",
+                        price=price,
+                        rating=f"{rating} stars" if rating else None,
+                        reviews=reviews,
+                        source='Flipkart',
+                        link=link,
+                        image=image,
+                        product_id=product_id
+                    ))
+            except Exception as e:
+                log_event(logger, logging.WARNING, "product_parse_failed", site=self.site, error=str(e))
+                continue
+                
         return products
 
 
+class QueryCache:
+    """Bounded LRU cache of search results with per-source TTLs and an optional stale window"""
+
+    def __init__(self, max_entries: int = 128, ttl_by_source: Optional[Dict[str, float]] = None,
+                 default_ttl: float = 300, stale_ttl: float = 0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_by_source = ttl_by_source or {}
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (stored_at, ttl, value)
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def ttl_for(self, sources: Iterable[str]) -> float:
+        # A combined result is only as fresh as its most volatile source
+        return min((self.ttl_by_source.get(source, self.default_ttl) for source in sources),
+                   default=self.default_ttl)
+
+    def get(self, key) -> Tuple[Optional[Dict], bool]:
+        """Return (value, is_stale); value is None on a miss"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None, False
+
+        stored_at, ttl, value = entry
+        age = self.clock() - stored_at
+        if age > ttl + self.stale_ttl:
+            del self._entries[key]
+            self.stats['expirations'] += 1
+            self.stats['misses'] += 1
+            return None, False
+
+        self._entries.move_to_end(key)
+        if age > ttl:
+            self.stats['stale_hits'] += 1
+            return value, True
+        self.stats['hits'] += 1
+        return value, False
+
+    def put(self, key, value: Dict, sources: Iterable[str]):
+        self._entries[key] = (self.clock(), self.ttl_for(sources), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['size'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['stale_hits']) / lookups if lookups else 0.0
+        return stats
+
+
 class EcommerceAgent:
     """Combined agent that searches across multiple e-commerce platforms"""
     
-    def __init__(self):
-        self.amazon_agent = AmazonAgent()
+    def __init__(self, cache_size: int = 128, cache_ttl: Optional[Dict[str, float]] = None,
+                 stale_while_revalidate: bool = False, stale_ttl: float = 600,
+                 price_history: Optional[str] = "price_history.db", amazon_fetch_mode: str = 'auto',
+                 browser_profile: Union[str, BrowserProfile] = 'lightweight', amazon_extraction: str = 'script',
+                 source_timeouts: Optional[Dict[str, float]] = None):
+        self.amazon_agent = AmazonAgent(fetch_mode=amazon_fetch_mode, browser_profile=browser_profile,
+                                        extraction=amazon_extraction)
         self.flipkart_agent = FlipkartAgent()
 
-    async def search_all_products(self, query: str) -> Dict:
-        # Run both scrapers concurrently
-        amazon_task = self.amazon_agent.search_products(query)
-        flipkart_task = self.flipkart_agent.search_products(query)
-        
-        # Wait for both tasks to complete
-        amazon_products, flipkart_products = await asyncio.gather(amazon_task, flipkart_task)
+        # Flipkart is fetched over plain HTTP and changes more often than it costs to refresh
+        ttl_by_source = {'amazon': 600, 'flipkart': 300}
+        ttl_by_source.update(cache_ttl or {})
+        self.stale_while_revalidate = stale_while_revalidate
+        self.cache = QueryCache(max_entries=cache_size, ttl_by_source=ttl_by_source,
+                                stale_ttl=stale_ttl if stale_while_revalidate else 0)
+        self._refresh_tasks = {}
+        self.in_flight = SingleFlight()
+        self.matcher = ProductMatcher()
+
+        # Longest each source may take before a search returns without it; Amazon may need a browser
+        self.source_timeouts = {'amazon': 60, 'flipkart': 20}
+        self.source_timeouts.update(source_timeouts or {})
+
+        # Every fresh scrape is appended to the price history from a single writer thread, off the event loop
+        self.price_store = PriceStore(price_history) if price_history else None
+        self._history_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="price-history")
+        self._history_writes = set()
+
+    async def start(self):
+        """Open long-lived resources held by the agents"""
+        await self.amazon_agent.start()
+        await self.flipkart_agent.start()
+
+    async def close(self):
+        """Release long-lived resources held by the agents"""
+        for task in list(self._refresh_tasks.values()):
+            task.cancel()
+        await self.amazon_agent.close()
+        await self.flipkart_agent.close()
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.amazon_agent.shutdown_driver_pool)
+        for agent in (self.amazon_agent, self.flipkart_agent):
+            agent.selectors.save()
+        if self._history_writes:
+            await asyncio.wait(self._history_writes)
+        self._history_executor.shutdown(wait=True)
+        if self.price_store is not None:
+            self.price_store.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def get_cache_stats(self) -> Dict:
+        return self.cache.get_stats()
+
+    def get_stats(self) -> Dict:
+        """Operational counters for the cache, in-flight searches and each agent"""
+        amazon_pool = self.amazon_agent._driver_pool
+        return {
+            "cache": self.cache.get_stats(),
+            "in_flight": dict(self.in_flight.stats, active=self.in_flight.in_flight()),
+            "price_history": self.price_store.get_stats() if self.price_store is not None else None,
+            "latency": {
+                "search": SEARCH_SECONDS.snapshot(),
+                "stages": STAGE_SECONDS.snapshot(),
+                "fields": FIELD_SECONDS.snapshot(),
+            },
+            "amazon": {
+                "fetch": self.amazon_agent.get_fetch_stats(),
+                "driver_pool": amazon_pool.get_stats() if amazon_pool is not None else None,
+                "readiness": self.amazon_agent.get_readiness_stats(),
+                "browser": self.amazon_agent.get_browser_stats(),
+                "in_flight": dict(self.amazon_agent.in_flight.stats, active=self.amazon_agent.in_flight.in_flight()),
+                "selectors": self.amazon_agent.selectors.get_stats(),
+            },
+            "flipkart": {
+                "in_flight": dict(self.flipkart_agent.in_flight.stats, active=self.flipkart_agent.in_flight.in_flight()),
+                "selectors": self.flipkart_agent.selectors.get_stats(),
+            },
+        }
+
+    async def search_all_products(self, query: str, sources: Optional[Iterable[str]] = None,
+                                  max_results: int = 5, deadline: Optional[float] = None) -> Dict:
+        """Combined results of every source that finished within its timeout and the deadline.
+
+        ``deadline`` is a latency budget in seconds for the whole search. Sources still running then
+        are cancelled and reported as timed_out in ``sources``, and the results are marked partial.
+        """
+        return self._copy_results(await self._search_cached(query, sources, max_results, deadline))
+
+    async def search_table(self, query: str, sources: Optional[Iterable[str]] = None,
+                           max_results: int = 5, deadline: Optional[float] = None) -> ProductTable:
+        """Combined results as a columnar ProductTable for vectorized filtering, sorting and stats"""
+        results = await self._search_cached(query, sources, max_results, deadline)
+        return ProductTable.from_products(results["products"])
+
+    async def _search_cached(self, query: str, sources: Optional[Iterable[str]], max_results: int,
+                             deadline: Optional[float] = None) -> Dict:
+        started = time.perf_counter()
+        sources = self.resolve_sources(sources)
+        key = (normalize_query(query), sources, max_results)
+
+        cached, stale = self.cache.get(key)
+        if cached is not None:
+            if stale:
+                # Serve the stale copy immediately and refresh it in the background
+                self._schedule_refresh(query, sources, max_results, key)
+            SEARCH_SECONDS.observe(time.perf_counter() - started, cache='stale' if stale else 'hit')
+            return cached
+
+        if deadline is None:
+            # Identical concurrent searches wait on a single combined scrape
+            results = await self.in_flight.run(key, lambda: self._refresh(query, sources, max_results, key))
+        else:
+            # A caller's own budget can't be shared, but the agents still coalesce the scrapes underneath
+            results = await self._refresh(query, sources, max_results, key, deadline)
+        SEARCH_SECONDS.observe(time.perf_counter() - started, cache='miss')
+        return results
+
+    def resolve_sources(self, sources: Optional[Iterable[str]]) -> Tuple[str, ...]:
+        """Lowercased, sorted and validated source names; every source when sources is None"""
+        if sources is None:
+            return SOURCES
+        resolved = tuple(sorted({source.lower() for source in sources}))
+        unknown = set(resolved) - set(SOURCES)
+        if unknown:
+            raise ValueError(f"Unknown sources: {', '.join(sorted(unknown))}")
+        return resolved
+
+    def _store(self, key, results: Dict, sources: Tuple[str, ...]):
+        # Empty results are usually a block page or a transient error, and partial ones are missing a
+        # source; don't pin either in the cache
+        if results["total_found"] and not results["partial"]:
+            self.cache.put(key, results, sources)
+
+    def _schedule_refresh(self, query: str, sources: Tuple[str, ...], max_results: int, key):
+        if key in self._refresh_tasks:
+            return
+
+        async def refresh():
+            try:
+                await self.in_flight.run(key, lambda: self._refresh(query, sources, max_results, key))
+            except Exception as e:
+                log_event(logger, logging.WARNING, "background_refresh_failed", query=query, error=str(e))
+            finally:
+                self._refresh_tasks.pop(key, None)
+
+        self._refresh_tasks[key] = asyncio.ensure_future(refresh())
+
+    async def _refresh(self, query: str, sources: Tuple[str, ...], max_results: int, key,
+                       deadline: Optional[float] = None) -> Dict:
+        results = await self._search_sources(query, sources, max_results, deadline)
+        self._store(key, results, sources)
+        return results
+
+    @staticmethod
+    def _copy_results(results: Dict) -> Dict:
+        # Cached results hold compact Product records; callers get fresh JSON-ready dicts they may reorder or edit
+        return dict(results, products=[product.to_dict() for product in results["products"]],
+                    matches=[group.to_dict() for group in results["matches"]],
+                    sources={source: dict(status) for source, status in results["sources"].items()})
+
+    async def stream_products(self, query: str, sources: Optional[Iterable[str]] = None,
+                              max_results: int = 5, deadline: Optional[float] = None) -> AsyncIterator[Dict]:
+        """Yield each source's products as soon as that source finishes or times out.
+
+        Emits one ``source_complete`` event per source, fastest first, with its status (ok, timed_out
+        or failed), followed by a single ``complete`` event carrying the same counts as search_all_products.
+        """
+        started = time.monotonic()
+        sources = self.resolve_sources(sources)
+        key = (normalize_query(query), sources, max_results)
+
+        cached, stale = self.cache.get(key)
+        if cached is not None:
+            if stale:
+                self._schedule_refresh(query, sources, max_results, key)
+            for source in sources:
+                products = [p.to_dict() for p in cached["products"] if p.source.lower() == source]
+                yield {"event": "source_complete", "source": source, "products": products, "status": "ok",
+                       "count": len(products), "elapsed": time.monotonic() - started, "cached": True}
+            SEARCH_SECONDS.observe(time.monotonic() - started, cache='stale' if stale else 'hit')
+            yield dict(self._copy_results(cached), event="complete", elapsed=time.monotonic() - started)
+            return
+
+        tasks = {asyncio.ensure_future(self._search_source_within(source, query, max_results,
+                                                                  self.source_timeout(source, deadline))): source
+                 for source in sources}
+        products_by_source = {}
+        statuses = {}
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    source = tasks[task]
+                    products, status = task.result()
+                    products_by_source[source] = products
+                    statuses[source] = status
+                    event = {"event": "source_complete", "source": source,
+                             "products": [product.to_dict() for product in products], "count": len(products),
+                             "status": status["status"], "elapsed": time.monotonic() - started, "cached": False}
+                    if "error" in status:
+                        event["error"] = status["error"]
+                    yield event
+        finally:
+            # The consumer stopped early; agents only abandon a scrape once no other caller waits on it
+            for task in tasks:
+                task.cancel()
+
+        results = self._combine(query, products_by_source, statuses)
+        self._store(key, results, sources)
+        SEARCH_SECONDS.observe(time.monotonic() - started, cache='miss')
+        yield dict(self._copy_results(results), event="complete", elapsed=time.monotonic() - started)
+
+    async def _search_source(self, source: str, query: str, max_results: int = 5) -> List[Product]:
+        agent = self.amazon_agent if source == 'amazon' else self.flipkart_agent
+        return await agent.search_products(query, max_results)
+
+    def source_timeout(self, source: str, deadline: Optional[float] = None) -> Optional[float]:
+        """Seconds a source may run in a search with the given deadline, None for no limit"""
+        timeout = self.source_timeouts.get(source)
+        if deadline is not None:
+            timeout = deadline if timeout is None else min(timeout, deadline)
+        return timeout
+
+    async def _search_source_within(self, source: str, query: str, max_results: int,
+                                    timeout: Optional[float]) -> Tuple[List[Product], Dict]:
+        """Products of one source and its status, ok, timed_out or failed; never raises"""
+        started = time.monotonic()
+        products = []
+        try:
+            # On timeout wait_for cancels the search, which stops the agent's page fetches
+            products = await asyncio.wait_for(self._search_source(source, query, max_results), timeout)
+            status = {"status": "ok"}
+        except asyncio.TimeoutError:
+            status = {"status": "timed_out", "timeout": timeout}
+            log_event(logger, logging.WARNING, "source_timed_out", source=source, query=query, timeout=timeout)
+        except Exception as e:
+            status = {"status": "failed", "error": str(e)}
+            log_event(logger, logging.WARNING, "source_failed", source=source, query=query, error=str(e))
+        status["count"] = len(products)
+        status["elapsed"] = round(time.monotonic() - started, 3)
+        SOURCE_OUTCOMES_TOTAL.inc(source=source, status=status["status"])
+        return products, status
+
+    async def _search_sources(self, query: str, sources: Tuple[str, ...], max_results: int = 5,
+                              deadline: Optional[float] = None) -> Dict:
+        # Run the enabled scrapers concurrently; each one is cut off at its own timeout
+        outcomes = await asyncio.gather(*(self._search_source_within(source, query, max_results,
+                                                                     self.source_timeout(source, deadline))
+                                          for source in sources))
+        return self._combine(query, {source: products for source, (products, _) in zip(sources, outcomes)},
+                             {source: status for source, (_, status) in zip(sources, outcomes)})
+
+    def _combine(self, query: str, products_by_source: Dict[str, List[Product]],
+                 statuses: Optional[Dict[str, Dict]] = None) -> Dict:
+        amazon_products = products_by_source.get('amazon', [])
+        flipkart_products = products_by_source.get('flipkart', [])
         
-        print(f"Found {len(amazon_products)} Amazon products")
-        print(f"Found {len(flipkart_products)} Flipkart products")
 
         # Combine results
         all_products = amazon_products + flipkart_products
+
+        # Group listings of the same item across platforms, cheapest offer first
+        with STAGE_SECONDS.time(site='all', stage='match'):
+            matches = self.matcher.match(all_products)
+        if statuses is None:
+            statuses = {source: {"status": "ok", "count": len(products)}
+                        for source, products in products_by_source.items()}
+        partial = any(status["status"] != "ok" for status in statuses.values())
+        log_event(logger, logging.INFO, "search_combined", query=query, amazon=len(amazon_products),
+                  flipkart=len(flipkart_products), matches=len(matches), partial=partial)
+        self.record_prices(all_products)
         
         return {
             "query": query,
             "products": all_products,
+            "matches": matches,
             "total_found": len(all_products),
             "amazon_count": len(amazon_products),
-            "flipkart_count": len(flipkart_products)
+            "flipkart_count": len(flipkart_products),
+            "sources": statuses,
+            "partial": partial
         }
 
+    def record_prices(self, products: List[Product]):
+        """Append products to the price history from the writer thread without waiting for it"""
+        if self.price_store is None or not products:
+            return
+
+        def record():
+            try:
+                self.price_store.record(products)
+            except Exception as e:
+                log_event(logger, logging.WARNING, "price_history_failed", error=str(e))
+
+        loop = asyncio.get_event_loop()
+        write = loop.run_in_executor(self._history_executor, record)
+        self._history_writes.add(write)
+        write.add_done_callback(self._history_writes.discard)
+
 
 # Example usage for each agent type
 async def main():
     # Get command line arguments to select which agent to use
     import sys
     agent_type = sys.argv[1] if len(sys.argv) > 1 else "all"
+    configure_logging()
+
+    # Agents live for the whole session so warm drivers are reused between queries; single-site
+    # searches skip the combined search and so never record price history
+    ecommerce_agent = EcommerceAgent(price_history=None if agent_type in ("amazon", "flipkart") else "price_history.db")
+    amazon_agent = ecommerce_agent.amazon_agent
+    flipkart_agent = ecommerce_agent.flipkart_agent
+    await ecommerce_agent.start()
     
-    while True:
-        query = input("\nEnter product to search (or 'quit' to exit): ").strip()
-        if query.lower() == 'quit':
-            break
-            
-        if not query:
-            print("Please enter a valid search query")
-            continue
-            
-        print(f"\nSearching for: {query}")
-        print("This may take a few moments...")
-        
-        if agent_type == "amazon":
-            # Amazon only search
-            amazon_agent = AmazonAgent()
-            products = await amazon_agent.search_products(query)
-            print(f"\nFound {len(products)} products on Amazon:")
-            if products:
-                print(json.dumps(products, indent=2, ensure_ascii=False))
-            else:
-                print("No products found. Please try again with different search terms.")
+    try:
+        while True:
+            query = input("\nEnter product to search (or 'quit' to exit): ").strip()
+            if query.lower() == 'quit':
+                break
                 
-        elif agent_type == "flipkart":
-            # Flipkart only search
-            flipkart_agent = FlipkartAgent()
-            products = await flipkart_agent.search_products(query)
-            print(f"\nFound {len(products)} products on Flipkart:")
-            if products:
-                print(json.dumps(products, indent=2, ensure_ascii=False))
-            else:
-                print("No products found. Please try again with different search terms.")
+            if not query:
+                print("Please enter a valid search query")
+                continue
                 
-        else:
-            # Search both platforms
-            ecommerce_agent = EcommerceAgent()
-            results = await ecommerce_agent.search_all_products(query)
+            print(f"\nSearching for: {query}")
+            print("This may take a few moments...")
             
-            if results["total_found"] == 0:
-                print("\nNo products found. Please try again with different search terms.")
+            if agent_type == "amazon":
+                # Amazon only search
+                try:
+                    products = await amazon_agent.search_products(query)
+                except Exception as e:
+                    print(f"\nAmazon search failed: {str(e)}")
+                    continue
+                print(f"\nFound {len(products)} products on Amazon:")
+                if products:
+                    print(json.dumps([product.to_dict() for product in products], indent=2, ensure_ascii=False))
+                else:
+                    print("No products found. Please try again with different search terms.")
+                    
+            elif agent_type == "flipkart":
+                # Flipkart only search
+                try:
+                    products = await flipkart_agent.search_products(query)
+                except Exception as e:
+                    print(f"\nFlipkart search failed: {str(e)}")
+                    continue
+                print(f"\nFound {len(products)} products on Flipkart:")
+                if products:
+                    print(json.dumps([product.to_dict() for product in products], indent=2, ensure_ascii=False))
+                else:
+                    print("No products found. Please try again with different search terms.")
+                    
             else:
-                print(f"\nFound {results['amazon_count']} products on Amazon and {results['flipkart_count']} products on Flipkart:")
-                print(json.dumps(results, indent=2, ensure_ascii=False))
+                # Search both platforms
+                results = await ecommerce_agent.search_all_products(query)
+                
+                if results["total_found"] == 0:
+                    print("\nNo products found. Please try again with different search terms.")
+                else:
+                    print(f"\nFound {results['amazon_count']} products on Amazon and {results['flipkart_count']} products on Flipkart:")
+                    print(json.dumps(results, indent=2, ensure_ascii=False))
+    finally:
+        await ecommerce_agent.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,165 @@
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from itertools import combinations
+from typing import List, Dict, Optional, Set, Tuple
+
+from product import Product
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:[-/][a-z0-9]+)*')
+UNIT_TOKENS = {'gb', 'tb', 'mb', 'mah', 'w', 'hz', 'inch', 'inches', 'cm', 'mm', 'kg', 'g', 'l', 'ml', 'mp', 'v'}
+SPEC_PATTERN = re.compile(r'^\d+(?:' + '|'.join(sorted(UNIT_TOKENS, key=len, reverse=True)) + r')$')
+STOPWORDS = {'a', 'an', 'and', 'the', 'of', 'in', 'for', 'with', 'to', 'by', 'on', 'new', 'latest', 'pack',
+             'combo', 'edition', 'version', 'series', 'color', 'colour'}
+# Words naming a variant of a model line; "iPhone 15" and "iPhone 15 Plus" are different phones
+VARIANT_TOKENS = {'plus', 'pro', 'max', 'ultra', 'mini', 'lite', 'neo', 'fe', 'note', 'air'}
+
+
+@dataclass(frozen=True)
+class ListingKey:
+    """Normalized view of a title used for blocking and scoring"""
+
+    tokens: frozenset
+    brand: Optional[str]
+    models: frozenset
+
+
+def is_model_number(token: str) -> bool:
+    # Model numbers mix letters and digits (SM-A536E, M34, WH1000XM4); capacities like 128gb are specs
+    return len(token) >= 3 and not token.isdigit() and not token.isalpha() and not SPEC_PATTERN.match(token)
+
+
+def listing_key(title: str) -> ListingKey:
+    raw = [token.replace('-', '').replace('/', '') for token in TOKEN_PATTERN.findall(title.lower())]
+    tokens = []
+    for token in raw:
+        # "128 GB" and "128GB" become the same spec token
+        if token in UNIT_TOKENS and tokens and tokens[-1].isdigit():
+            tokens[-1] += token
+        elif token not in STOPWORDS:
+            tokens.append(token)
+    models = {token for token in tokens if is_model_number(token)}
+    brand = tokens[0] if tokens and tokens[0].isalpha() else None
+    return ListingKey(frozenset(tokens), brand, frozenset(models))
+
+
+@dataclass
+class MatchGroup:
+    """Listings judged to be the same item, cheapest first"""
+
+    products: List[Product]
+    score: float
+    sources: List[str] = field(default_factory=list)
+
+    @property
+    def best(self) -> Product:
+        return self.products[0]
+
+    def to_dict(self) -> Dict:
+        prices = [product.price_value for product in self.products if product.price_value is not None]
+        return {
+            'title': self.best.name,
+            'best_price': self.best.price,
+            'best_price_value': self.best.price_value,
+            'best_source': self.best.source,
+            'savings': max(prices) - min(prices) if prices else None,
+            'score': round(self.score, 3),
+            'sources': list(self.sources),
+            'products': [product.to_dict() for product in self.products],
+        }
+
+
+class ProductMatcher:
+    """Groups equivalent listings from different sources by title tokens, brand, model numbers and price.
+
+    Candidate pairs come from an inverted index over title tokens, so only listings sharing a reasonably
+    rare token are ever scored; tokens found in more than max_posting listings are too common to block on.
+    Pairs are then accepted best score first, and a group never holds two listings from the same source.
+    """
+
+    def __init__(self, min_similarity: float = 0.6, price_tolerance: float = 0.35, model_bonus: float = 0.3,
+                 max_posting: int = 50):
+        self.min_similarity = min_similarity
+        self.price_tolerance = price_tolerance
+        self.model_bonus = model_bonus
+        self.max_posting = max_posting
+
+    def match(self, products: List[Product]) -> List[MatchGroup]:
+        """Groups spanning more than one source, best match first"""
+        keys = [listing_key(product.name) for product in products]
+        pairs = self.score_pairs(products, keys)
+
+        # Greedy assignment, best pair first: a listing joins at most one group and each group holds one
+        # listing per source, so a weak pair can never chain two different items together
+        group_of: Dict[int, int] = {}
+        members: List[Dict[str, int]] = []
+        scores: List[float] = []
+        for (i, j), score in sorted(pairs.items(), key=lambda pair: (-pair[1], pair[0])):
+            group_i, group_j = group_of.get(i), group_of.get(j)
+            if group_i is not None and group_j is not None:
+                continue
+            if group_i is None and group_j is None:
+                group_of[i] = group_of[j] = len(members)
+                members.append({products[i].source: i, products[j].source: j})
+                scores.append(score)
+                continue
+            group, newcomer = (group_i, j) if group_i is not None else (group_j, i)
+            if products[newcomer].source in members[group]:
+                continue
+            group_of[newcomer] = group
+            members[group][products[newcomer].source] = newcomer
+            scores[group] = min(scores[group], score)
+
+        groups = []
+        for by_source, score in zip(members, scores):
+            ordered = sorted((products[i] for i in by_source.values()),
+                             key=lambda product: product.price_value if product.price_value is not None else float('inf'))
+            groups.append(MatchGroup(ordered, score, sorted(by_source)))
+        groups.sort(key=lambda group: group.score, reverse=True)
+        return groups
+
+    def score_pairs(self, products: List[Product], keys: List[ListingKey]) -> Dict[Tuple[int, int], float]:
+        """Scores of every accepted cross-source pair among the blocked candidates"""
+        index: Dict[str, List[int]] = defaultdict(list)
+        for i, key in enumerate(keys):
+            for token in key.tokens:
+                index[token].append(i)
+
+        candidates: Set[Tuple[int, int]] = set()
+        for token, posting in index.items():
+            if len(posting) < 2 or (len(posting) > self.max_posting and not is_model_number(token)):
+                continue
+            for i, j in combinations(posting, 2):
+                if products[i].source != products[j].source:
+                    candidates.add((i, j))
+
+        pairs = {}
+        for i, j in candidates:
+            score = self.similarity(products[i], keys[i], products[j], keys[j])
+            if score is not None:
+                pairs[(i, j)] = score
+        return pairs
+
+    def similarity(self, a: Product, key_a: ListingKey, b: Product, key_b: ListingKey) -> Optional[float]:
+        """Match score for two listings, or None when they cannot be the same item"""
+        if key_a.brand and key_b.brand and key_a.brand != key_b.brand:
+            return None
+        if a.price_value and b.price_value:
+            low, high = sorted((a.price_value, b.price_value))
+            if high > low * (1 + self.price_tolerance):
+                return None
+
+        if (key_a.tokens ^ key_b.tokens) & VARIANT_TOKENS:
+            return None
+
+        # Mostly overlap with the shorter title, since Amazon titles pack in far more spec words than
+        # Flipkart's; a quarter is overlap of the union, so words missing from one title still cost something
+        shared = len(key_a.tokens & key_b.tokens)
+        score = (0.75 * shared / min(len(key_a.tokens), len(key_b.tokens))
+                 + 0.25 * shared / len(key_a.tokens | key_b.tokens))
+        if key_a.models and key_b.models:
+            if not key_a.models & key_b.models:
+                # Different model numbers from the same brand are different products
+                return None
+            score += self.model_bonus
+        return score if score >= self.min_similarity else None
@@ -0,0 +1,281 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _StackCounter
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Tuple
+
+# Seconds; covers everything from a field lookup to a slow browser search
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict[str, str]) -> Tuple[str, ...]:
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(labelnames, (
+        value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values))]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {','.join(key): value for key, value in self._values.items()}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels, in the Prometheus sense"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}  # key -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> Dict:
+        """Count, sum, mean and bucket-estimated p50/p90/p99 per label set"""
+        summary = {}
+        with self._lock:
+            items = [(key, list(series[0]), series[1], series[2]) for key, series in self._series.items()]
+        for key, counts, total, count in items:
+            summary[','.join(key)] = {
+                'count': count,
+                'sum': total,
+                'mean': total / count if count else 0.0,
+                'p50': self._quantile(counts, count, 0.5),
+                'p90': self._quantile(counts, count, 0.9),
+                'p99': self._quantile(counts, count, 0.99),
+            }
+        return summary
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series[0]), series[1], series[2]) for key, series in self._series.items())
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+    def _quantile(self, counts: List[int], count: int, fraction: float) -> Optional[float]:
+        # Upper bound of the bucket holding the quantile, None when it lies beyond the largest bucket
+        if not count:
+            return None
+        target = fraction * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return bound
+        return None
+
+
+class MetricsRegistry:
+    """Named counters and histograms, rendered together in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._get_or_create(name, lambda: Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(name, lambda: Histogram(name, help_text, labelnames, buckets))
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def _get_or_create(self, name: str, create):
+        # Asking for an existing name returns the registered metric instead of a second series
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = create()
+            return self._metrics[name]
+
+
+REGISTRY = MetricsRegistry()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, event and the record's structured fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {'ts': round(record.created, 3), 'level': record.levelname.lower(), 'logger': record.name,
+                 'event': record.getMessage()}
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Human readable variant: event followed by key=value pairs"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = ' '.join(f"{key}={value}" for key, value in getattr(record, 'fields', {}).items())
+        line = f"{record.levelname.lower():7} {record.name}: {record.getMessage()} {fields}".rstrip()
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+def log_event(logger: logging.Logger, level: int, event: str, **fields):
+    """Log an event name with structured fields; cheap when the level is disabled"""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={'fields': fields})
+
+
+def configure_logging(level: Optional[str] = None, json_format: Optional[bool] = None):
+    """Send structured logs to stderr; SCRAPER_LOG_LEVEL and SCRAPER_LOG_FORMAT=json|text override the defaults"""
+    level = level or os.environ.get('SCRAPER_LOG_LEVEL', 'INFO')
+    if json_format is None:
+        json_format = os.environ.get('SCRAPER_LOG_FORMAT', 'text') == 'json'
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if json_format else KeyValueFormatter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
+
+
+class SamplingProfiler:
+    """Opt-in statistical profiler sampling the stacks of all threads at a fixed interval.
+
+    Unlike cProfile it adds no per-call overhead, so it can run inside the live service. Results are
+    available as collapsed stacks, the input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks = _StackCounter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def collapsed(self) -> str:
+        """'thread;outer;...;inner count' lines, hottest first"""
+        return '\n'.join(f"{stack} {count}" for stack, count in self._stacks.most_common()) + '\n'
+
+    def write(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+
+def profiler_from_env() -> Optional[SamplingProfiler]:
+    """Start a profiler when SCRAPER_PROFILE names an output file; write it with profiler.write() at exit"""
+    if not os.environ.get('SCRAPER_PROFILE'):
+        return None
+    profiler = SamplingProfiler(float(os.environ.get('SCRAPER_PROFILE_INTERVAL', '0.005')))
+    profiler.start()
+    return profiler
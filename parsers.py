@@ -0,0 +1,186 @@
+import re
+from typing import List, Dict, Optional, Iterable, Union
+
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # selectolax is an optional, faster backend
+    LexborHTMLParser = None
+
+
+# Leading compound of a CSS selector: tag, classes and attribute names, e.g. div.s-asin[data-asin]
+COMPOUND_PATTERN = re.compile(r'^\s*([a-zA-Z][\w-]*)?((?:\.[\w-]+)*)((?:\[[^\]]+\])*)')
+CLASS_PATTERN = re.compile(r'\.([\w-]+)')
+ATTRIBUTE_PATTERN = re.compile(r'\[\s*([\w-]+)')
+
+
+def _selector_rule(selector: str) -> Dict:
+    """Loose description of the outermost element a selector can match"""
+    match = COMPOUND_PATTERN.match(selector)
+    tag, classes, attributes = match.groups() if match else (None, '', '')
+    return {
+        'tag': tag.lower() if tag else None,
+        'classes': set(CLASS_PATTERN.findall(classes or '')),
+        'attributes': set(ATTRIBUTE_PATTERN.findall(attributes or '')),
+    }
+
+
+def container_strainer(selectors: Iterable[str]) -> SoupStrainer:
+    """SoupStrainer that keeps only subtrees which could contain a match for any of the selectors.
+
+    Only the leading compound of each selector is used so the strainer is a superset of the real
+    matches; the selectors themselves still run against the partial tree afterwards.
+    """
+    rules = [_selector_rule(selector) for selector in selectors]
+    tags = {rule['tag'] for rule in rules}
+
+    def matches(tag_or_name, attrs=None):
+        if isinstance(tag_or_name, str):
+            name = tag_or_name
+            if attrs is None:
+                # Attributes are not available at this point, keep every candidate tag
+                return None in tags or name in tags
+        else:
+            name, attrs = tag_or_name.name, tag_or_name.attrs
+
+        attrs = attrs or {}
+        classes = attrs.get('class') or ''
+        classes = set(classes.split() if isinstance(classes, str) else classes)
+        for rule in rules:
+            if rule['tag'] and rule['tag'] != name:
+                continue
+            if rule['classes'] <= classes and all(attribute in attrs for attribute in rule['attributes']):
+                return True
+        return False
+
+    return SoupStrainer(matches)
+
+
+class ParserBackend:
+    """Common interface the agents use to parse pages and read fields from nodes"""
+
+    name = None
+    supports_partial = False
+
+    def parse(self, html: str, container_selectors: Optional[List[str]] = None):
+        raise NotImplementedError
+
+    def compile(self, selector: str):
+        """Precompile a selector; the result can be passed to select() and select_one()"""
+        return selector
+
+    def select(self, node, selector) -> List:
+        raise NotImplementedError
+
+    def select_one(self, node, selector):
+        raise NotImplementedError
+
+    def text(self, node) -> str:
+        raise NotImplementedError
+
+    def get_text(self, node, separator: str = '', strip: bool = False) -> str:
+        raise NotImplementedError
+
+    def attr(self, node, name: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def parent(self, node):
+        raise NotImplementedError
+
+
+class SoupBackend(ParserBackend):
+    """BeautifulSoup backed parser using lxml or the pure Python html.parser"""
+
+    def __init__(self, features: str = 'lxml', partial: bool = True):
+        self.name = features
+        self.features = features
+        self.partial = partial
+        self.supports_partial = partial
+        self._strainers = {}
+
+    def parse(self, html: str, container_selectors: Optional[List[str]] = None):
+        parse_only = None
+        if self.partial and container_selectors:
+            key = tuple(container_selectors)
+            if key not in self._strainers:
+                self._strainers[key] = container_strainer(container_selectors)
+            parse_only = self._strainers[key]
+        return BeautifulSoup(html, self.features, parse_only=parse_only)
+
+    def compile(self, selector: str):
+        return soupsieve.compile(selector)
+
+    def select(self, node, selector) -> List:
+        if isinstance(selector, str):
+            return node.select(selector)
+        return selector.select(node)
+
+    def select_one(self, node, selector):
+        if isinstance(selector, str):
+            return node.select_one(selector)
+        return selector.select_one(node)
+
+    def text(self, node) -> str:
+        return node.text
+
+    def get_text(self, node, separator: str = '', strip: bool = False) -> str:
+        return node.get_text(separator=separator, strip=strip)
+
+    def attr(self, node, name: str) -> Optional[str]:
+        return node.attrs.get(name)
+
+    def parent(self, node):
+        return node.parent
+
+
+class SelectolaxBackend(ParserBackend):
+    """Lexbor backed parser from selectolax; parses whole pages fast enough to skip straining"""
+
+    name = 'selectolax'
+
+    def __init__(self):
+        if LexborHTMLParser is None:
+            raise ImportError("The selectolax parser backend requires 'pip install selectolax'")
+
+    def parse(self, html: str, container_selectors: Optional[List[str]] = None):
+        return LexborHTMLParser(html)
+
+    def select(self, node, selector) -> List:
+        return node.css(selector)
+
+    def select_one(self, node, selector):
+        return node.css_first(selector)
+
+    def text(self, node) -> str:
+        return node.text()
+
+    def get_text(self, node, separator: str = '', strip: bool = False) -> str:
+        if not strip:
+            return node.text(separator=separator)
+        # Match BeautifulSoup, which drops whitespace-only strings instead of joining empty parts
+        parts = (part.strip() for part in node.text(separator='\x00').split('\x00'))
+        return separator.join(part for part in parts if part)
+
+    def attr(self, node, name: str) -> Optional[str]:
+        return node.attributes.get(name)
+
+    def parent(self, node):
+        return node.parent
+
+
+PARSER_BACKENDS = {
+    'lxml': lambda: SoupBackend('lxml'),
+    'html.parser': lambda: SoupBackend('html.parser'),
+    'selectolax': SelectolaxBackend,
+}
+
+
+def get_parser_backend(parser: Union[str, ParserBackend] = 'lxml') -> ParserBackend:
+    """Resolve a backend name such as 'lxml', 'html.parser' or 'selectolax' to a backend instance"""
+    if isinstance(parser, ParserBackend):
+        return parser
+    if parser not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend '{parser}', choose from {', '.join(PARSER_BACKENDS)}")
+    return PARSER_BACKENDS[parser]()
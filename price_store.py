@@ -0,0 +1,160 @@
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Optional, Iterable
+
+from product import Product
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    product_key TEXT NOT NULL,
+    name TEXT,
+    link TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    latest_price REAL,
+    latest_rating REAL,
+    latest_at REAL,
+    UNIQUE (source, product_key)
+);
+CREATE TABLE IF NOT EXISTS prices (
+    product_id INTEGER NOT NULL REFERENCES products (id),
+    observed_at REAL NOT NULL,
+    price REAL,
+    rating REAL,
+    review_count INTEGER,
+    PRIMARY KEY (product_id, observed_at)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS prices_observed_at ON prices (observed_at, product_id, price);
+"""
+
+
+class PriceStore:
+    """SQLite price history keyed on product identity (ASIN, Flipkart id or link) and source.
+
+    Each record() call is one transaction. A price row is only written when a product's price or rating
+    changed since its latest observation; unchanged sightings just move last_seen forward, which keeps
+    the history table proportional to actual price movements.
+    """
+
+    def __init__(self, path: str = "price_history.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        # WAL lets readers query history while a scrape is being written
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self.stats = {'batches': 0, 'products_seen': 0, 'price_changes': 0, 'write_time_total': 0.0}
+
+    def record(self, products: Iterable[Product], observed_at: Optional[float] = None) -> int:
+        """Upsert products and append changed prices in one transaction; returns the number of price rows written"""
+        observed_at = observed_at if observed_at is not None else time.time()
+        rows = [(product.source.lower(), product.key(), product.name, product.link,
+                 product.price_value, product.rating_value, product.review_count)
+                for product in products]
+        if not rows:
+            return 0
+
+        started = time.monotonic()
+        with self._lock, self._conn:
+            conn = self._conn
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS staging (source TEXT, product_key TEXT, name TEXT, link TEXT,"
+                         " price REAL, rating REAL, review_count INTEGER)")
+            conn.execute("DELETE FROM staging")
+            conn.executemany("INSERT INTO staging VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+            conn.execute("""
+                INSERT INTO products (source, product_key, name, link, first_seen, last_seen)
+                SELECT source, product_key, name, link, ?, ? FROM staging WHERE true
+                ON CONFLICT (source, product_key) DO UPDATE SET
+                    name = excluded.name, link = COALESCE(excluded.link, link), last_seen = excluded.last_seen
+            """, (observed_at, observed_at))
+            changed = conn.execute("""
+                INSERT OR REPLACE INTO prices (product_id, observed_at, price, rating, review_count)
+                SELECT p.id, ?, s.price, s.rating, s.review_count
+                FROM staging s JOIN products p ON p.source = s.source AND p.product_key = s.product_key
+                WHERE p.latest_at IS NULL OR p.latest_price IS NOT s.price OR p.latest_rating IS NOT s.rating
+            """, (observed_at,)).rowcount
+            conn.execute("""
+                UPDATE products SET latest_price = s.price, latest_rating = s.rating, latest_at = ?
+                FROM staging s
+                WHERE products.source = s.source AND products.product_key = s.product_key
+                    AND (products.latest_at IS NULL OR products.latest_price IS NOT s.price
+                         OR products.latest_rating IS NOT s.rating)
+            """, (observed_at,))
+
+        self.stats['batches'] += 1
+        self.stats['products_seen'] += len(rows)
+        self.stats['price_changes'] += changed
+        self.stats['write_time_total'] += time.monotonic() - started
+        return changed
+
+    def latest(self, source: str, product_key: str) -> Optional[Dict]:
+        """Most recent price and rating of one product, or None if it was never seen"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source, product_key, name, link, latest_price AS price, latest_rating AS rating,"
+                " latest_at AS changed_at, last_seen FROM products WHERE source = ? AND product_key = ?",
+                (source.lower(), product_key)).fetchone()
+        return dict(row) if row is not None else None
+
+    def history(self, source: str, product_key: str, start: Optional[float] = None,
+                end: Optional[float] = None) -> List[Dict]:
+        """Price changes of one product between start and end, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT h.observed_at, h.price, h.rating, h.review_count FROM prices h"
+                " JOIN products p ON p.id = h.product_id"
+                " WHERE p.source = ? AND p.product_key = ? AND h.observed_at >= ? AND h.observed_at <= ?"
+                " ORDER BY h.observed_at",
+                (source.lower(), product_key, start if start is not None else 0,
+                 end if end is not None else float('inf'))).fetchall()
+        return [dict(row) for row in rows]
+
+    def biggest_drops(self, since: Optional[float] = None, limit: int = 20, source: Optional[str] = None) -> List[Dict]:
+        """Products whose latest price is furthest below their highest price since `since` (default: 7 days),
+        counting the price they already had when `since` began"""
+        since = since if since is not None else time.time() - 7 * 24 * 3600
+        # Only changes are stored, so the price in effect when the window opened is each product's last
+        # row before it; without that row a price unchanged since before `since` would be missed
+        query = """
+            WITH observed (product_id, price) AS (
+                SELECT product_id, price FROM prices WHERE observed_at >= ?
+                UNION ALL
+                SELECT id, (SELECT price FROM prices WHERE product_id = products.id AND observed_at < ?
+                            ORDER BY observed_at DESC LIMIT 1)
+                FROM products
+            )
+            SELECT p.source, p.product_key, p.name, p.link, p.latest_price AS price, MAX(h.price) AS high,
+                   MAX(h.price) - p.latest_price AS drop_amount,
+                   (MAX(h.price) - p.latest_price) / MAX(h.price) AS drop_fraction
+            FROM observed h JOIN products p ON p.id = h.product_id
+            WHERE p.latest_price IS NOT NULL {source_filter}
+            GROUP BY h.product_id
+            HAVING high > p.latest_price
+            ORDER BY drop_amount DESC
+            LIMIT ?
+        """
+        params = [since, since]
+        if source is not None:
+            query = query.format(source_filter="AND p.source = ?")
+            params.append(source.lower())
+        else:
+            query = query.format(source_filter="")
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['path'] = self.path
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
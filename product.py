@@ -0,0 +1,85 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# Compiled once at import; these run for every extracted product
+NUMBER_PATTERN = re.compile(r'\d[\d,]*(?:\.\d+)?')
+REVIEWS_PATTERN = re.compile(r'(\d[\d,]*)\s*reviews', re.IGNORECASE)
+RUPEE_PRICE_PATTERN = re.compile(r'₹[\d,]+')
+
+
+def parse_number(text: Optional[str]) -> Optional[float]:
+    """First number in a display string such as "₹1,299.00" or "4.3 out of 5 stars", or None"""
+    if not text:
+        return None
+    match = NUMBER_PATTERN.search(text)
+    if match is None:
+        return None
+    return float(match.group(0).replace(',', ''))
+
+
+def parse_review_count(text: Optional[str]) -> Optional[int]:
+    """Review count from "(1,234)" or Flipkart's "12,345 Ratings & 1,234 Reviews", or None"""
+    if not text:
+        return None
+    match = REVIEWS_PATTERN.search(text)
+    if match is not None:
+        return int(match.group(1).replace(',', ''))
+    value = parse_number(text)
+    return int(value) if value is not None else None
+
+
+@dataclass(frozen=True, slots=True)
+class Product:
+    """One search result: the display strings as scraped plus numeric values parsed once at extraction"""
+
+    name: str
+    price: str
+    rating: str
+    reviews: str
+    source: str
+    product_id: Optional[str] = None
+    link: Optional[str] = None
+    image: Optional[str] = None
+    price_value: Optional[float] = None
+    rating_value: Optional[float] = None
+    review_count: Optional[int] = None
+
+    @classmethod
+    def create(cls, name: str, price: Optional[str], rating: Optional[str], reviews: Optional[str],
+               source: str, product_id: Optional[str] = None, link: Optional[str] = None,
+               image: Optional[str] = None) -> 'Product':
+        """Build a product from scraped text, filling the display placeholders and numeric fields"""
+        return cls(
+            name=name,
+            price=price if price else "Not available",
+            rating=rating if rating else "No rating",
+            reviews=reviews if reviews else "No reviews",
+            source=source,
+            product_id=product_id,
+            link=link,
+            image=image,
+            price_value=parse_number(price),
+            rating_value=parse_number(rating),
+            review_count=parse_review_count(reviews),
+        )
+
+    def key(self) -> str:
+        """Identity used to drop duplicates across result pages"""
+        return self.product_id or self.link or self.name
+
+    def to_dict(self) -> Dict:
+        """JSON shape served to clients: the display strings plus the parsed numeric values"""
+        return {
+            'name': self.name,
+            'price': self.price,
+            'rating': self.rating,
+            'reviews': self.reviews,
+            'source': self.source,
+            'link': self.link,
+            'image': self.image,
+            'product_id': self.product_id,
+            'price_value': self.price_value,
+            'rating_value': self.rating_value,
+            'review_count': self.review_count,
+        }
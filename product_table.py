@@ -0,0 +1,107 @@
+from typing import List, Dict, Optional, Iterable, Union
+
+import numpy as np
+import pandas as pd
+
+from product import Product, NUMBER_PATTERN
+
+COLUMNS = ['name', 'price', 'rating', 'reviews', 'source', 'link', 'image', 'product_id',
+           'price_value', 'rating_value', 'review_count']
+SORT_COLUMNS = {'price': 'price_value', 'rating': 'rating_value', 'reviews': 'review_count'}
+
+
+def parse_numbers(values: pd.Series) -> pd.Series:
+    """Vectorized parse_number for display strings that arrive without their numeric value"""
+    extracted = values.astype('string').str.extract(f"({NUMBER_PATTERN.pattern})", expand=False)
+    return pd.to_numeric(extracted.str.replace(',', '', regex=False), errors='coerce').astype('float64')
+
+
+class ProductTable:
+    """Column-oriented product results backed by a DataFrame, for filtering and sorting large result sets.
+
+    Numeric columns are float64 with NaN for missing values and the source column is categorical, so
+    filters, sorts, top-k and per-source statistics run as NumPy operations instead of Python loops.
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+
+    @classmethod
+    def from_products(cls, products: Iterable[Union[Product, Dict]]) -> 'ProductTable':
+        rows = [product.to_dict() if isinstance(product, Product) else product for product in products]
+        frame = pd.DataFrame.from_records(rows, columns=COLUMNS)
+
+        # Results from older clients or caches may only carry the display strings
+        for column, display in (('price_value', 'price'), ('rating_value', 'rating'), ('review_count', 'reviews')):
+            values = pd.to_numeric(frame[column], errors='coerce').astype('float64')
+            missing = values.isna().to_numpy()
+            if missing.any():
+                values[missing] = parse_numbers(frame.loc[missing, display])
+            frame[column] = values
+        frame['source'] = frame['source'].astype('category')
+        return cls(frame)
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def filter(self, sources: Optional[Iterable[str]] = None, min_price: Optional[float] = None,
+               max_price: Optional[float] = None, min_rating: Optional[float] = None) -> 'ProductTable':
+        """Rows matching every given condition; products without a price or rating fail those bounds"""
+        mask = np.ones(len(self.frame), dtype=bool)
+        if sources is not None:
+            mask &= self.frame['source'].isin(list(sources)).to_numpy()
+        price = self.frame['price_value'].to_numpy()
+        if min_price is not None:
+            mask &= price >= min_price
+        if max_price is not None:
+            mask &= price <= max_price
+        if min_rating is not None:
+            mask &= self.frame['rating_value'].to_numpy() >= min_rating
+        return ProductTable(self.frame[mask])
+
+    def sort(self, by: str = 'price', descending: bool = False) -> 'ProductTable':
+        """Stable sort on price, rating or reviews; missing prices rank as the most expensive, other gaps as 0"""
+        return ProductTable(self.frame.iloc[self._order(by, descending)])
+
+    def top_k(self, k: int, by: str = 'price', descending: bool = False) -> 'ProductTable':
+        """The k leading rows in sort() order, found with a partial sort instead of sorting the whole table"""
+        keys = self._sort_keys(by, descending)
+        if k < len(keys):
+            candidates = np.argpartition(keys, k - 1)[:k]
+            order = candidates[np.argsort(keys[candidates], kind='stable')]
+        else:
+            order = np.argsort(keys, kind='stable')
+        return ProductTable(self.frame.iloc[order])
+
+    def source_stats(self) -> pd.DataFrame:
+        """Count and price and rating summaries per source"""
+        grouped = self.frame.groupby('source', observed=True)
+        return grouped.agg(count=('name', 'size'),
+                           min_price=('price_value', 'min'),
+                           median_price=('price_value', 'median'),
+                           mean_price=('price_value', 'mean'),
+                           mean_rating=('rating_value', 'mean'))
+
+    def comparison_frame(self, name_length: int = 50) -> pd.DataFrame:
+        """The Quick Comparison table: truncated names, display price and rating, source"""
+        return pd.DataFrame({
+            'Product': self.frame['name'].str.slice(0, name_length) + "...",
+            'Price': self.frame['price'],
+            'Rating': self.frame['rating'],
+            'Source': self.frame['source'].astype(str),
+        }).reset_index(drop=True)
+
+    def to_records(self) -> List[Dict]:
+        """Rows as product dicts, missing values as None, e.g. for rendering product cards"""
+        frame = self.frame.astype(object).where(self.frame.notna(), None)
+        return frame.to_dict(orient='records')
+
+    def _sort_keys(self, by: str, descending: bool) -> np.ndarray:
+        if by not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {by}, expected one of {', '.join(SORT_COLUMNS)}")
+        keys = self.frame[SORT_COLUMNS[by]].to_numpy(dtype='float64', copy=True)
+        keys[np.isnan(keys)] = np.inf if by == 'price' else 0
+        return -keys if descending else keys
+
+    def _order(self, by: str, descending: bool) -> np.ndarray:
+        return np.argsort(self._sort_keys(by, descending), kind='stable')
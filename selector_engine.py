@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import List, Dict, Optional, Tuple
+
+from metrics import log_event
+from parsers import ParserBackend
+
+logger = logging.getLogger("scraper")
+
+
+class SelectorChain:
+    """Candidate selectors for one field, compiled once and always tried in declared order.
+
+    Selectors can overlap, so the declared order decides which element a field is read from; hit
+    counts are kept for reporting and drift detection only and never change that order.
+    """
+
+    def __init__(self, field: str, selectors: List[str], parser: ParserBackend):
+        self.field = field
+        self.selectors = list(selectors)
+        self.compiled = {selector: parser.compile(selector) for selector in selectors}
+        self._candidates = [(selector, self.compiled[selector]) for selector in self.selectors]
+
+        self.hits = {selector: 0 for selector in selectors}
+        self.last_hit = {selector: None for selector in selectors}
+        self.lookups = 0
+        self.misses = 0
+        self.consecutive_misses = 0
+        self.last_winner = None
+        self.winner_changes = []
+
+    def candidates(self) -> List[Tuple[str, object]]:
+        return self._candidates
+
+    def record(self, winner: Optional[str]):
+        self.lookups += 1
+        if winner is None:
+            self.misses += 1
+            self.consecutive_misses += 1
+            return
+
+        self.consecutive_misses = 0
+        self.hits[winner] += 1
+        self.last_hit[winner] = time.time()
+        if self.last_winner is not None and self.last_winner != winner:
+            # Remember layout changes: a different selector started matching
+            self.winner_changes.append({'at': time.time(), 'from': self.last_winner, 'to': winner})
+            del self.winner_changes[:-20]
+        self.last_winner = winner
+
+    def restore(self, state: Dict):
+        """Apply persisted counters, ignoring selectors that are no longer declared"""
+        for selector, count in state.get('hits', {}).items():
+            if selector in self.hits:
+                self.hits[selector] = count
+        for selector, at in state.get('last_hit', {}).items():
+            if selector in self.last_hit:
+                self.last_hit[selector] = at
+        self.lookups = state.get('lookups', 0)
+        self.misses = state.get('misses', 0)
+        self.winner_changes = state.get('winner_changes', [])
+        self.last_winner = self.winner_changes[-1]['to'] if self.winner_changes else None
+        if self.last_winner not in self.compiled:
+            self.last_winner = None
+
+    def to_dict(self) -> Dict:
+        return {
+            'hits': dict(self.hits),
+            'last_hit': dict(self.last_hit),
+            'lookups': self.lookups,
+            'misses': self.misses,
+            'winner_changes': list(self.winner_changes),
+        }
+
+
+class SelectorEngine:
+    """Per-site selector chains that track which selectors match and persist their hit counts"""
+
+    def __init__(self, site: str, parser: ParserBackend, state_path: Optional[str] = None,
+                 drift_threshold: int = 5, save_every: int = 200):
+        self.site = site
+        self.parser = parser
+        self.state_path = state_path
+        self.drift_threshold = drift_threshold
+        self.save_every = save_every
+
+        self.chains: Dict[str, SelectorChain] = {}
+        self._saved_state = {}
+        self._lock = threading.Lock()
+        self._records_since_save = 0
+
+        if state_path and os.path.exists(state_path):
+            try:
+                with open(state_path, encoding="utf-8") as f:
+                    self._saved_state = json.load(f).get('fields', {})
+            except (OSError, ValueError) as e:
+                log_event(logger, logging.WARNING, "selector_state_unreadable", path=state_path, error=str(e))
+
+    def register(self, field: str, selectors: List[str]):
+        chain = SelectorChain(field, selectors, self.parser)
+        if field in self._saved_state:
+            chain.restore(self._saved_state[field])
+        self.chains[field] = chain
+
+    def select_one(self, field: str, node):
+        """First element matched by the field's selector chain, or None"""
+        chain = self.chains[field]
+        for selector, compiled in chain.candidates():
+            element = self.parser.select_one(node, compiled)
+            if element is not None:
+                self._record(chain, selector)
+                return element
+        self._record(chain, None)
+        return None
+
+    def select_all(self, field: str, node, min_count: int = 1) -> Tuple[List, Optional[str]]:
+        """Elements for the first selector in the chain matching at least min_count of them"""
+        chain = self.chains[field]
+        elements = []
+        for selector, compiled in chain.candidates():
+            elements = self.parser.select(node, compiled)
+            if len(elements) >= min_count:
+                self._record(chain, selector)
+                return elements, selector
+        self._record(chain, None)
+        return elements, None
+
+    def order(self, field: str) -> List[str]:
+        """Selectors of a field in the order they should be tried, e.g. for matching outside the parser"""
+        return list(self.chains[field].selectors)
+
+    def record(self, field: str, winner: Optional[str]):
+        """Count a lookup whose matching was done elsewhere, with the selector that matched or None"""
+        self._record(self.chains[field], winner)
+
+    def get_stats(self) -> Dict:
+        fields = {}
+        with self._lock:
+            for field, chain in self.chains.items():
+                fields[field] = {
+                    'order': list(chain.selectors),
+                    'hits': dict(chain.hits),
+                    'lookups': chain.lookups,
+                    'misses': chain.misses,
+                    'hit_rate': (chain.lookups - chain.misses) / chain.lookups if chain.lookups else 0.0,
+                    'consecutive_misses': chain.consecutive_misses,
+                    # A run of misses usually means the site layout changed under every selector
+                    'drifted': chain.consecutive_misses >= self.drift_threshold,
+                    'winner_changes': list(chain.winner_changes[-5:]),
+                }
+        return {'site': self.site, 'fields': fields}
+
+    def save(self, path: Optional[str] = None):
+        """Write hit counts so they survive restarts"""
+        path = path or self.state_path
+        if not path:
+            return
+        with self._lock:
+            state = {'site': self.site, 'saved_at': time.time(),
+                     'fields': {field: chain.to_dict() for field, chain in self.chains.items()}}
+            self._records_since_save = 0
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _record(self, chain: SelectorChain, winner: Optional[str]):
+        with self._lock:
+            chain.record(winner)
+            self._records_since_save += 1
+            due = self.save_every and self._records_since_save >= self.save_every
+        if due:
+            try:
+                self.save()
+            except OSError as e:
+                log_event(logger, logging.WARNING, "selector_state_save_failed", path=self.state_path, error=str(e))
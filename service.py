@@ -0,0 +1,153 @@
+"""FastAPI search service that keeps warm agents for the life of the process.
+
+    uvicorn service:app --host 0.0.0.0 --port 8000
+"""
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from main import EcommerceAgent, SOURCES
+from metrics import REGISTRY, SamplingProfiler, configure_logging, profiler_from_env
+
+# How Amazon pages are fetched: 'auto' (HTTP, Chrome when blocked), 'http' or 'browser'
+AMAZON_FETCH = os.environ.get("SEARCH_AMAZON_FETCH", "auto")
+# 'lightweight' blocks images, fonts, stylesheets and trackers in Chrome; 'full' loads everything
+BROWSER_PROFILE = os.environ.get("SEARCH_BROWSER_PROFILE", "lightweight")
+# 'script' extracts Amazon results inside Chrome, 'page_source' transfers and parses the whole page
+AMAZON_EXTRACTION = os.environ.get("SEARCH_AMAZON_EXTRACTION", "script")
+# Number of Chrome drivers to start before the first request; 0 starts them lazily, the default unless
+# every Amazon search goes through the browser
+WARM_DRIVERS = int(os.environ.get("SEARCH_WARM_DRIVERS", "1" if AMAZON_FETCH == "browser" else "0"))
+STALE_WHILE_REVALIDATE = os.environ.get("SEARCH_STALE_WHILE_REVALIDATE", "1") == "1"
+# Path of the SQLite price history, empty to disable it
+PRICE_HISTORY = os.environ.get("SEARCH_PRICE_HISTORY", "price_history.db")
+# Default latency budget of a search in seconds, empty for none; sources still running then are left out
+DEFAULT_DEADLINE = float(os.environ["SEARCH_DEADLINE"]) if os.environ.get("SEARCH_DEADLINE") else None
+# /debug/profile samples the live process; only served when explicitly enabled
+PROFILING_ENABLED = os.environ.get("SEARCH_PROFILING", "0") == "1"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    # SCRAPER_PROFILE=<file> samples the whole service lifetime and writes collapsed stacks at shutdown
+    profiler = profiler_from_env()
+    agent = EcommerceAgent(stale_while_revalidate=STALE_WHILE_REVALIDATE, price_history=PRICE_HISTORY or None,
+                           amazon_fetch_mode=AMAZON_FETCH, browser_profile=BROWSER_PROFILE,
+                           amazon_extraction=AMAZON_EXTRACTION)
+    await agent.start()
+    if WARM_DRIVERS:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, agent.amazon_agent.driver_pool.warm_up, WARM_DRIVERS)
+    app.state.agent = agent
+    app.state.started_at = time.time()
+    try:
+        yield
+    finally:
+        await agent.close()
+        if profiler is not None:
+            profiler.stop()
+            profiler.write(os.environ["SCRAPER_PROFILE"])
+
+
+app = FastAPI(title="Shopping Browser Assistance", lifespan=lifespan)
+
+
+def parse_sources(sources: Optional[str]):
+    if not sources:
+        return None
+    requested = [source.strip().lower() for source in sources.split(',') if source.strip()]
+    unknown = [source for source in requested if source not in SOURCES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sources: {', '.join(unknown)}")
+    return requested
+
+
+@app.get("/search")
+async def search(request: Request, q: str = Query(..., min_length=1),
+                 sources: Optional[str] = Query(None, description="comma separated, e.g. amazon,flipkart"),
+                 max_results: int = Query(5, ge=1, le=100),
+                 deadline: Optional[float] = Query(None, gt=0, le=300, description="latency budget in seconds")):
+    """Combined results; sources that time out or fail are left out and reported in `sources`"""
+    agent: EcommerceAgent = request.app.state.agent
+    return await agent.search_all_products(q, parse_sources(sources), max_results=max_results,
+                                           deadline=deadline or DEFAULT_DEADLINE)
+
+
+@app.get("/search/stream")
+async def search_stream(request: Request, q: str = Query(..., min_length=1),
+                        sources: Optional[str] = Query(None, description="comma separated, e.g. amazon,flipkart"),
+                        max_results: int = Query(5, ge=1, le=100),
+                        deadline: Optional[float] = Query(None, gt=0, le=300, description="latency budget in seconds")):
+    """Newline delimited JSON: one source_complete event per source, then a complete event"""
+    agent: EcommerceAgent = request.app.state.agent
+    requested = parse_sources(sources)
+
+    async def events():
+        async for event in agent.stream_products(q, requested, max_results=max_results,
+                                                 deadline=deadline or DEFAULT_DEADLINE):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+def get_price_store(request: Request):
+    store = request.app.state.agent.price_store
+    if store is None:
+        raise HTTPException(status_code=404, detail="Price history is disabled")
+    return store
+
+
+# Plain def endpoints run in FastAPI's thread pool, keeping SQLite reads off the event loop
+@app.get("/prices/latest")
+def price_latest(request: Request, source: str, product_key: str):
+    latest = get_price_store(request).latest(source, product_key)
+    if latest is None:
+        raise HTTPException(status_code=404, detail="Product has no price history")
+    return latest
+
+
+@app.get("/prices/history")
+def price_history(request: Request, source: str, product_key: str,
+                  start: Optional[float] = None, end: Optional[float] = None):
+    return get_price_store(request).history(source, product_key, start, end)
+
+
+@app.get("/prices/drops")
+def price_drops(request: Request, days: float = Query(7, gt=0), limit: int = Query(20, ge=1, le=500),
+                source: Optional[str] = None):
+    since = time.time() - days * 24 * 3600
+    return get_price_store(request).biggest_drops(since=since, limit=limit, source=source)
+
+
+@app.get("/health")
+async def health(request: Request):
+    return {"status": "ok", "uptime": time.time() - request.app.state.started_at}
+
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    agent: EcommerceAgent = request.app.state.agent
+    return agent.get_stats()
+
+
+@app.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def metrics_prometheus():
+    """Stage latency histograms and counters in the Prometheus text exposition format"""
+    return PlainTextResponse(REGISTRY.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+def debug_profile(seconds: float = Query(10, gt=0, le=120), interval: float = Query(0.005, ge=0.001, le=1)):
+    """Sample every thread for `seconds` and return collapsed stacks for a flame graph"""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled, set SEARCH_PROFILING=1")
+    with SamplingProfiler(interval) as profiler:
+        time.sleep(seconds)
+    return PlainTextResponse(profiler.collapsed())
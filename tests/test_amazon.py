@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import pytest
+
+from main import AmazonAgent, DriverPool, PageReadiness
+
+
+class FakeDriver:
+    """Driver whose result containers never render; readiness waits unless the page looks settled"""
+
+    window_handles = ['main']
+
+    def __init__(self, ready_state='interactive', text=''):
+        self.visited = []
+        self.page_source_reads = 0
+        self.ready_state = ready_state
+        self.text = text
+
+    class switch_to:
+        @staticmethod
+        def window(handle):
+            pass
+
+    def get(self, url):
+        self.visited.append(url)
+
+    def execute_script(self, script, *args):
+        if script == PageReadiness.SETTLED_SCRIPT:
+            return self.ready_state == 'complete' or any(marker in self.text for marker in args[0])
+        if 'readyState' in script:
+            return self.ready_state
+        return [None, 0]
+
+    def delete_all_cookies(self):
+        pass
+
+    def get_log(self, kind):
+        return []
+
+    @property
+    def page_source(self):
+        self.page_source_reads += 1
+        return '<html></html>'
+
+
+@pytest.mark.parametrize('extraction', ['script', 'page_source'])
+def test_cancelled_browser_search_releases_a_reset_driver(extraction):
+    agent = AmazonAgent(selector_state_dir=None, fetch_mode='browser', extraction=extraction)
+    driver = FakeDriver()
+    agent._driver_pool = DriverPool(lambda: driver, size=1)
+
+    async def run():
+        task = asyncio.ensure_future(agent.search_page('phone', 1, 5))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    started = time.monotonic()
+    asyncio.run(run())
+    # Waiting for the executor thread at loop shutdown stays well under the 15s readiness deadline
+    assert time.monotonic() - started < 5
+    assert driver.visited[-1] == 'about:blank'
+    assert driver.page_source_reads == 0
+    stats = agent._driver_pool.get_stats()
+    assert stats['idle'] == 1
+    assert stats['crashed'] == 0
+
+
+@pytest.mark.parametrize('ready_state, text', [('complete', ''), ('interactive', 'No results for "zzqx".')])
+def test_readiness_stops_waiting_on_a_no_results_page(ready_state, text):
+    readiness = PageReadiness(AmazonAgent.item_selectors, deadline=15, empty_markers=AmazonAgent.no_results_markers)
+
+    started = time.monotonic()
+    report = readiness.wait(FakeDriver(ready_state, text))
+    assert time.monotonic() - started < 1
+    assert report['empty']
+    assert not report['timed_out']
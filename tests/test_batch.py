@@ -0,0 +1,32 @@
+import asyncio
+
+from batch import BatchSearchEngine, BatchQuery
+from main import EcommerceAgent
+from product import Product
+
+
+def make_product(name, source):
+    return Product.create(name=name, price="₹1,000", rating=None, reviews=None, source=source)
+
+
+def test_mixed_case_sources_adapt_rates(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    async def run():
+        agent = EcommerceAgent(price_history=None)
+
+        async def amazon_pages(query, max_results):
+            return [make_product("Phone", "Amazon")]
+
+        agent.amazon_agent.collect_pages = amazon_pages
+        engine = BatchSearchEngine(agent, host_rates={'www.amazon.in': 100})
+        try:
+            return await engine.run([BatchQuery("phone", sources=('Amazon',))]), engine
+        finally:
+            await agent.close()
+
+    records, engine = asyncio.run(run())
+    assert 'error' not in records[0]
+    assert records[0]['results']['amazon_count'] == 1
+    assert engine.stats['completed'] == 1
+    assert engine.stats['failed'] == 0
@@ -0,0 +1,45 @@
+from matching import ProductMatcher
+from product import Product
+
+
+def make_product(name, price, source):
+    return Product.create(name=name, price=price, rating=None, reviews=None, source=source)
+
+
+def group_names(groups):
+    return [sorted((product.source, product.name) for product in group.products) for group in groups]
+
+
+def test_model_variants_stay_in_separate_groups():
+    products = [make_product("Apple iPhone 15 (128 GB)", "₹69,900", "Amazon"),
+                make_product("Apple iPhone 15 Plus (128 GB)", "₹79,900", "Amazon"),
+                make_product("Apple iPhone 15 (128 GB)", "₹65,999", "Flipkart"),
+                make_product("Apple iPhone 15 Plus (128 GB)", "₹75,999", "Flipkart")]
+
+    groups = ProductMatcher().match(products)
+    assert sorted(group_names(groups)) == [
+        [("Amazon", "Apple iPhone 15 (128 GB)"), ("Flipkart", "Apple iPhone 15 (128 GB)")],
+        [("Amazon", "Apple iPhone 15 Plus (128 GB)"), ("Flipkart", "Apple iPhone 15 Plus (128 GB)")],
+    ]
+    assert sorted(group.to_dict()['savings'] for group in groups) == [3901, 3901]
+
+
+def test_a_group_holds_one_listing_per_source():
+    products = [make_product("Samsung Galaxy M34 5G (Midnight Blue, 128 GB)", "₹16,999", "Amazon"),
+                make_product("Samsung Galaxy M34 5G (Midnight Blue, 128 GB)", "₹16,499", "Flipkart"),
+                make_product("Samsung Galaxy M34 5G (Midnight Blue, 128 GB) with Fast Charger", "₹18,499", "Flipkart")]
+
+    groups = ProductMatcher().match(products)
+    assert group_names(groups) == [[("Amazon", "Samsung Galaxy M34 5G (Midnight Blue, 128 GB)"),
+                                    ("Flipkart", "Samsung Galaxy M34 5G (Midnight Blue, 128 GB)")]]
+
+
+def test_long_and_short_titles_of_one_item_still_match():
+    products = [make_product("boAt Rockerz 450 Bluetooth On Ear Headphones with Mic, Upto 15 Hours Playback, "
+                             "40MM Drivers, Padded Ear Cushions, Dual Modes (Luscious Black)", "₹1,499", "Amazon"),
+                make_product("boAt Rockerz 450 Bluetooth Headset (Luscious Black, On the Ear)", "₹1,399", "Flipkart")]
+
+    groups = ProductMatcher().match(products)
+    assert len(groups) == 1
+    assert groups[0].sources == ["Amazon", "Flipkart"]
+    assert groups[0].best.source == "Flipkart"
@@ -0,0 +1,47 @@
+import time
+
+from price_store import PriceStore
+from product import Product
+
+DAY = 24 * 3600
+
+
+def make_product(name, price, product_id="B0TEST"):
+    return Product.create(name=name, price=price, rating="4.2 out of 5 stars", reviews="1,024", source="Amazon",
+                          product_id=product_id)
+
+
+def test_biggest_drops_counts_a_high_price_recorded_before_the_window(tmp_path):
+    store = PriceStore(str(tmp_path / "history.db"))
+    now = time.time()
+    try:
+        store.record([make_product("Laptop", "₹50,000")], observed_at=now - 30 * DAY)
+        store.record([make_product("Laptop", "₹50,000")], observed_at=now - 10 * DAY)
+        store.record([make_product("Laptop", "₹35,000")], observed_at=now - DAY)
+
+        drops = store.biggest_drops(since=now - 7 * DAY)
+        assert len(drops) == 1
+        assert drops[0]['high'] == 50000
+        assert drops[0]['price'] == 35000
+        assert drops[0]['drop_amount'] == 15000
+
+        # A price that has not moved since before the window is not a drop
+        store.record([make_product("Phone", "₹20,000", "B0OTHER")], observed_at=now - 30 * DAY)
+        assert [drop['product_key'] for drop in store.biggest_drops(since=now - 7 * DAY)] == [drops[0]['product_key']]
+        assert store.biggest_drops(since=now - 7 * DAY, source="flipkart") == []
+    finally:
+        store.close()
+
+
+def test_biggest_drops_ignores_prices_before_the_last_change_preceding_the_window(tmp_path):
+    store = PriceStore(str(tmp_path / "history.db"))
+    now = time.time()
+    try:
+        store.record([make_product("Laptop", "₹60,000")], observed_at=now - 30 * DAY)
+        store.record([make_product("Laptop", "₹40,000")], observed_at=now - 20 * DAY)
+        store.record([make_product("Laptop", "₹35,000")], observed_at=now - DAY)
+
+        drops = store.biggest_drops(since=now - 7 * DAY)
+        assert [(drop['high'], drop['price']) for drop in drops] == [(40000, 35000)]
+    finally:
+        store.close()
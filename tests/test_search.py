@@ -0,0 +1,188 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from main import BaseAgent, EcommerceAgent, QueryCache, SingleFlight
+from product import Product
+
+
+def make_product(name, product_id=None, source="Amazon"):
+    return Product.create(name=name, price="₹1,000", rating=None, reviews=None, source=source,
+                          product_id=product_id)
+
+
+def test_single_flight_coalesces_concurrent_callers():
+    calls = []
+
+    async def run():
+        flight = SingleFlight()
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 42
+
+        results = await asyncio.gather(*(flight.run('key', work) for _ in range(3)))
+        return results, flight
+
+    results, flight = asyncio.run(run())
+    assert results == [42, 42, 42]
+    assert len(calls) == 1
+    assert flight.stats['coalesced'] == 2
+    assert flight.in_flight() == 0
+
+
+def test_single_flight_keeps_work_while_a_waiter_remains():
+    async def run():
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return 42
+
+        first = asyncio.ensure_future(flight.run('key', work))
+        second = asyncio.ensure_future(flight.run('key', work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, flight
+
+    result, flight = asyncio.run(run())
+    assert result == 42
+    assert flight.stats['abandoned'] == 0
+
+
+def test_single_flight_caller_after_abandon_gets_fresh_task():
+    # The abandoned task is still unwinding (its cleanup awaits) when the next caller arrives
+    async def run():
+        flight = SingleFlight()
+        unwinding = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_cleanup():
+            try:
+                await asyncio.sleep(10)
+            finally:
+                unwinding.set()
+                await release.wait()
+
+        async def quick():
+            return 'fresh'
+
+        waiter = asyncio.ensure_future(flight.run('key', slow_cleanup))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.wait_for(unwinding.wait(), 1)
+
+        result = await asyncio.wait_for(flight.run('key', quick), 1)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return result, flight
+
+    result, flight = asyncio.run(run())
+    assert result == 'fresh'
+    assert flight.stats['abandoned'] == 1
+    assert flight.stats['started'] == 2
+
+
+def test_query_cache_ttl_stale_window_and_eviction():
+    now = [1000.0]
+    cache = QueryCache(max_entries=2, ttl_by_source={'amazon': 10, 'flipkart': 5}, stale_ttl=20,
+                       clock=lambda: now[0])
+
+    cache.put('a', {'value': 1}, ('amazon', 'flipkart'))
+    assert cache.get('a') == ({'value': 1}, False)
+
+    # The combined entry expires with its most volatile source
+    now[0] += 6
+    assert cache.get('a') == ({'value': 1}, True)
+    now[0] += 20
+    assert cache.get('a') == (None, False)
+
+    cache.put('b', {'value': 2}, ('amazon',))
+    cache.put('c', {'value': 3}, ('amazon',))
+    cache.get('b')
+    cache.put('d', {'value': 4}, ('amazon',))
+    assert cache.get('c') == (None, False)
+    assert cache.get('b')[0] == {'value': 2}
+    assert cache.stats['evictions'] == 1
+
+
+class PagedAgent(BaseAgent):
+    site = 'test'
+    expected_page_size = 2
+
+    def __init__(self, pages, **kwargs):
+        super().__init__(selector_state_dir=None, **kwargs)
+        self.pages = pages
+        self.requested = []
+
+    async def search_page(self, search_query, page, wanted):
+        self.requested.append(page)
+        await asyncio.sleep(0.001 * (3 - page % 3))
+        result = self.pages.get(page, [])
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def test_collect_pages_merges_in_page_order_without_duplicates():
+    pages = {1: [make_product("A", "1"), make_product("B", "2")],
+             2: [make_product("B", "2"), make_product("C", "3")],
+             3: [make_product("D", "4"), make_product("E", "5")]}
+    agent = PagedAgent(pages, page_concurrency=2)
+
+    products = asyncio.run(agent.collect_pages("query", 4))
+    assert [product.name for product in products] == ["A", "B", "C", "D"]
+
+
+def test_collect_pages_stops_after_an_empty_page():
+    pages = {1: [make_product("A", "1"), make_product("B", "2")]}
+    agent = PagedAgent(pages, page_concurrency=1, max_pages=5)
+
+    products = asyncio.run(agent.collect_pages("query", 10))
+    assert [product.name for product in products] == ["A", "B"]
+    assert agent.requested == [1, 2]
+
+
+def test_collect_pages_raises_when_the_first_page_fails():
+    agent = PagedAgent({1: RuntimeError("connection reset")}, page_concurrency=1)
+
+    with pytest.raises(RuntimeError, match="connection reset"):
+        asyncio.run(agent.collect_pages("query", 10))
+
+
+def test_collect_pages_keeps_earlier_pages_when_a_later_one_fails():
+    pages = {1: [make_product("A", "1"), make_product("B", "2")], 2: RuntimeError("connection reset")}
+    agent = PagedAgent(pages, page_concurrency=1, max_pages=5)
+
+    products = asyncio.run(agent.collect_pages("query", 10))
+    assert [product.name for product in products] == ["A", "B"]
+    assert agent.requested == [1, 2]
+
+
+def test_unreachable_source_is_reported_failed_and_not_cached(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    async def run():
+        agent = EcommerceAgent(price_history=None)
+
+        async def amazon_pages(query, max_results):
+            return [make_product("Phone", "1")]
+
+        async def unreachable(url, etag=None, last_modified=None):
+            raise aiohttp.ClientConnectionError("connection refused")
+
+        agent.amazon_agent.collect_pages = amazon_pages
+        agent.flipkart_agent.fetch_html = unreachable
+        try:
+            return await agent.search_all_products("phone"), agent
+        finally:
+            await agent.close()
+
+    results, agent = asyncio.run(run())
+    assert results["sources"]["flipkart"]["status"] == "failed"
+    assert results["sources"]["amazon"]["status"] == "ok"
+    assert results["partial"] is True
+    assert agent.cache.get_stats()["size"] == 0
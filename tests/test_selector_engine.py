@@ -0,0 +1,58 @@
+import json
+import os
+
+from main import AmazonAgent
+from parsers import get_parser_backend
+from selector_engine import SelectorEngine
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures", "v1")
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def extract(agent, html):
+    return [product.to_dict() for product in agent.parse_products(html, limit=None)]
+
+
+def test_earlier_pages_do_not_change_what_later_pages_extract():
+    laptop = read_fixture("amazon_laptop.html")
+    headphones = read_fixture("amazon_headphones_recipe.html")
+    expected_laptop = extract(AmazonAgent(selector_state_dir=None), laptop)
+    expected_headphones = extract(AmazonAgent(selector_state_dir=None), headphones)
+
+    agent = AmazonAgent(selector_state_dir=None)
+    assert extract(agent, headphones) == expected_headphones
+    assert extract(agent, laptop) == expected_laptop
+    assert extract(agent, headphones) == expected_headphones
+    assert agent.selectors.order('price') == agent.field_selectors['price']
+
+
+def test_declared_order_holds_long_after_a_selector_last_matched():
+    agent = AmazonAgent(parser='html.parser', selector_state_dir=None)
+    whole_only = agent.parser.parse('<div><span class="a-price-whole">999</span></div>')
+    for _ in range(1500):
+        assert agent.field_text('price', whole_only) == '999'
+
+    # The first declared selector never hit, yet still wins on a page where both match
+    both = agent.parser.parse('<div><span class="a-price"><span class="a-offscreen">₹1,299</span>'
+                              '<span class="a-price-whole">1,299</span></span></div>')
+    assert agent.field_text('price', both) == '₹1,299'
+    assert agent.selectors.order('price') == agent.field_selectors['price']
+
+    stats = agent.selectors.get_stats()['fields']['price']
+    assert stats['hits']['.a-price-whole'] == 1500
+    assert stats['winner_changes'][-1]['to'] == '.a-price .a-offscreen'
+
+
+def test_restore_ignores_a_persisted_order(tmp_path):
+    state_path = tmp_path / "selectors_test.json"
+    state_path.write_text(json.dumps({'fields': {'price': {
+        'order': ['.sale', '.price'], 'hits': {'.sale': 5, '.price': 1}, 'lookups': 6, 'misses': 0}}}))
+
+    engine = SelectorEngine('test', get_parser_backend('html.parser'), state_path=str(state_path))
+    engine.register('price', ['.price', '.sale'])
+    assert engine.order('price') == ['.price', '.sale']
+    assert engine.get_stats()['fields']['price']['hits'] == {'.price': 1, '.sale': 5}
@@ -0,0 +1,37 @@
+import asyncio
+import os
+
+from main import EcommerceAgent
+from watchlist import WatchItem, WatchlistScheduler
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures", "v1")
+
+
+def test_validators_are_only_kept_once_products_were_recorded(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open(os.path.join(FIXTURES_DIR, "flipkart_mobiles_list.html"), encoding="utf-8") as f:
+        listing = f.read()
+    bodies = ["<html><body>Something went wrong</body></html>", listing]
+    sent_etags = []
+
+    async def run():
+        agent = EcommerceAgent(price_history=None)
+
+        async def fetch_html(url, etag=None, last_modified=None):
+            sent_etags.append(etag)
+            if etag == '"v1"':
+                return 304, None, {}
+            return 200, bodies.pop(0), {'ETag': '"v1"'}
+
+        agent.flipkart_agent.fetch_html = fetch_html
+        scheduler = WatchlistScheduler(agent)
+        item = WatchItem("mobiles", "flipkart")
+        try:
+            return [await scheduler.check(item) for _ in range(3)], item
+        finally:
+            await agent.close()
+
+    outcomes, item = asyncio.run(run())
+    assert outcomes == ['failed', 'changed', 'not_modified']
+    assert sent_etags == [None, None, '"v1"']
+    assert item.etag == '"v1"'
@@ -0,0 +1,309 @@
+import argparse
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import random
+import re
+import sys
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Callable
+
+from batch import TokenBucket
+from main import EcommerceAgent
+from metrics import configure_logging, log_event
+from product import Product, RUPEE_PRICE_PATTERN, parse_number
+
+logger = logging.getLogger("scraper")
+
+# Scripts, styles and comments carry nonces and tracking ids that change on every load
+VOLATILE_PATTERN = re.compile(r'<script\b.*?</script>|<style\b.*?</style>|<!--.*?-->', re.DOTALL | re.IGNORECASE)
+TAG_PATTERN = re.compile(r'<[^>]+>')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+TITLE_PATTERN = re.compile(r'<title[^>]*>(.*?)</title>', re.DOTALL | re.IGNORECASE)
+STRUCTURED_PRICE_PATTERN = re.compile(r'"price"\s*:\s*"?([\d,.]+)|itemprop="price"[^>]*content="([\d,.]+)"')
+
+
+def page_fingerprint(html_content: str) -> str:
+    """Hash of the visible text of a page, ignoring markup, scripts and whitespace.
+
+    Attribute churn and script payloads don't affect the hash; any change to a listed title,
+    price or rating does.
+    """
+    text = TAG_PATTERN.sub(' ', VOLATILE_PATTERN.sub(' ', html_content))
+    return hashlib.sha256(WHITESPACE_PATTERN.sub(' ', text).strip().encode('utf-8')).hexdigest()
+
+
+def product_from_page(html_content: str, url: str, source: str) -> Optional[Product]:
+    """Title and price of a product page from its structured data, falling back to the first rupee price"""
+    match = STRUCTURED_PRICE_PATTERN.search(html_content)
+    price = (match.group(1) or match.group(2)) if match else None
+    if price is None:
+        match = RUPEE_PRICE_PATTERN.search(TAG_PATTERN.sub(' ', VOLATILE_PATTERN.sub(' ', html_content)))
+        price = match.group(0) if match else None
+    if price is None or parse_number(price) is None:
+        return None
+    title = TITLE_PATTERN.search(html_content)
+    name = WHITESPACE_PATTERN.sub(' ', title.group(1)).strip() if title else url
+    return Product.create(name=name, price=price if price.startswith('₹') else f"₹{price}", rating=None,
+                          reviews=None, source=source.title(), link=url)
+
+
+@dataclass
+class WatchItem:
+    """A search query or product URL re-checked every `interval` seconds"""
+
+    target: str
+    source: str  # 'amazon' or 'flipkart'
+    interval: float = 3600
+    max_results: int = 20
+
+    next_run: float = 0.0
+    fingerprint: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    last_checked: Optional[float] = None
+    stats: Dict[str, int] = field(default_factory=lambda: {'checks': 0, 'not_modified': 0, 'unchanged': 0,
+                                                             'changed': 0, 'failed': 0})
+
+    @property
+    def is_url(self) -> bool:
+        return self.target.startswith(('http://', 'https://'))
+
+    @property
+    def key(self):
+        return (self.source, self.target)
+
+
+class WatchlistScheduler:
+    """Re-checks watched queries and product URLs on their intervals using the agents of an EcommerceAgent.
+
+    Each check fetches the page first and stops there when the server answers 304 Not Modified or the page
+    fingerprint matches the previous run; only changed pages are parsed and written to the price history.
+    First runs are spread over each item's interval and every later run is jittered, so a large watchlist
+    turns into a steady trickle of requests instead of bursts.
+    """
+
+    def __init__(self, agent: EcommerceAgent, max_concurrency: int = 4, jitter: float = 0.1,
+                 host_rates: Optional[Dict[str, float]] = None,
+                 on_change: Optional[Callable[[WatchItem, List[Product]], None]] = None):
+        self.agent = agent
+        self.max_concurrency = max_concurrency
+        self.jitter = jitter
+        self.on_change = on_change
+        self.buckets = {host: TokenBucket(rate) for host, rate in (host_rates or {}).items()}
+
+        self.items: Dict = {}
+        self._heap = []
+        self._order = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._running = set()
+        self.stats = {'checks': 0, 'not_modified': 0, 'unchanged': 0, 'changed': 0, 'failed': 0,
+                      'products_recorded': 0}
+
+    def add(self, item: WatchItem):
+        """Watch item, first checking it at a stable offset within its interval"""
+        # A hash of the target rather than random() keeps the spread stable across restarts
+        offset = zlib.crc32(f"{item.source}:{item.target}".encode('utf-8')) % 1000 / 1000 * item.interval
+        item.next_run = time.time() + offset
+        self.items[item.key] = item
+        heapq.heappush(self._heap, (item.next_run, next(self._order), item))
+        self._wakeup.set()
+
+    def remove(self, source: str, target: str):
+        # The heap entry is dropped lazily when it comes due
+        self.items.pop((source, target), None)
+
+    async def run(self, stop: Optional[asyncio.Event] = None):
+        """Check due items until stop is set, running at most max_concurrency checks at a time"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        stop = stop or asyncio.Event()
+        try:
+            while not stop.is_set():
+                if not self._heap:
+                    await self._sleep(None, stop)
+                    continue
+                due, _, item = self._heap[0]
+                delay = due - time.time()
+                if delay > 0:
+                    await self._sleep(delay, stop)
+                    continue
+
+                heapq.heappop(self._heap)
+                if self.items.get(item.key) is not item:
+                    continue
+                await semaphore.acquire()
+                task = asyncio.ensure_future(self._check_and_reschedule(item, semaphore))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+        finally:
+            for task in list(self._running):
+                task.cancel()
+
+    async def check(self, item: WatchItem) -> str:
+        """Check one item now; returns 'not_modified', 'unchanged', 'changed' or 'failed'"""
+        item.stats['checks'] += 1
+        self.stats['checks'] += 1
+        try:
+            outcome = await self._check(item)
+        except Exception as e:
+            log_event(logger, logging.WARNING, "watch_check_failed", source=item.source, target=item.target, error=str(e))
+            outcome = 'failed'
+        item.last_checked = time.time()
+        item.stats[outcome] += 1
+        self.stats[outcome] += 1
+        return outcome
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['watched'] = len(self.items)
+        stats['running'] = len(self._running)
+        # Share of checks that ended before any parsing or storage
+        skipped = stats['not_modified'] + stats['unchanged']
+        stats['skip_rate'] = skipped / stats['checks'] if stats['checks'] else 0.0
+        stats['hosts'] = {host: bucket.get_stats() for host, bucket in self.buckets.items()}
+        return stats
+
+    async def _sleep(self, delay: Optional[float], stop: asyncio.Event):
+        self._wakeup.clear()
+        waiters = [asyncio.ensure_future(self._wakeup.wait()), asyncio.ensure_future(stop.wait())]
+        try:
+            await asyncio.wait(waiters, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def _check_and_reschedule(self, item: WatchItem, semaphore: asyncio.Semaphore):
+        try:
+            await self.check(item)
+        finally:
+            semaphore.release()
+            if self.items.get(item.key) is item:
+                item.next_run = time.time() + item.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+                heapq.heappush(self._heap, (item.next_run, next(self._order), item))
+                self._wakeup.set()
+
+    @staticmethod
+    def _unusable(site_agent, status: int, html_content: Optional[str], item: WatchItem) -> Optional[str]:
+        # Why a plain HTTP response can't be fingerprinted, or None when it can
+        if status != 200:
+            return f"HTTP {status}"
+        if item.source != 'amazon':
+            return None
+        reason = site_agent.block_reason(status, html_content)
+        # Product pages carry no result listings, only a block page disqualifies them
+        return None if item.is_url and reason == 'empty' else reason
+
+    @staticmethod
+    def _keep_validators(item: WatchItem, validators: Dict[str, str]):
+        item.etag = validators.get('ETag', item.etag)
+        item.last_modified = validators.get('Last-Modified', item.last_modified)
+
+    async def _check(self, item: WatchItem) -> str:
+        site_agent = self.agent.amazon_agent if item.source == 'amazon' else self.agent.flipkart_agent
+        bucket = self.buckets.get(site_agent.host) or site_agent.rate_limiter
+        if bucket is not None:
+            await bucket.acquire()
+
+        url = item.target if item.is_url else site_agent.search_url(item.target)
+        html_content = None
+        validators = {}
+        if item.source == 'flipkart' or site_agent.fetch_mode != 'browser':
+            status, html_content, validators = await site_agent.fetch_html(url, item.etag, item.last_modified)
+            if status == 304:
+                return 'not_modified'
+            reason = self._unusable(site_agent, status, html_content, item)
+            if reason is not None:
+                if item.source == 'flipkart' or site_agent.fetch_mode == 'http':
+                    raise RuntimeError(reason)
+                html_content, validators = None, {}
+        if html_content is None:
+            # Browser loads cannot be conditional; the fingerprint still saves parsing and storage
+            loop = asyncio.get_event_loop()
+            if item.is_url:
+                html_content = await loop.run_in_executor(None, site_agent.fetch_url_html, url)
+            else:
+                html_content = await loop.run_in_executor(None, site_agent.fetch_search_html, item.target, 1,
+                                                          item.max_results)
+
+        fingerprint = page_fingerprint(html_content)
+        if fingerprint == item.fingerprint:
+            # Same content as the recorded page, so its validators may stand in for it
+            self._keep_validators(item, validators)
+            return 'unchanged'
+
+        if item.is_url:
+            product = product_from_page(html_content, url, item.source)
+            products = [product] if product is not None else []
+        else:
+            products = await site_agent.parse_offloaded(html_content, limit=item.max_results)
+        if not products:
+            # Keep the old fingerprint so a block page or an empty render is retried next time
+            raise RuntimeError("no products extracted")
+
+        # Validators are only kept together with a recorded fingerprint; saved earlier, a page that failed
+        # here would be answered 304 from then on and never recorded
+        item.fingerprint = fingerprint
+        self._keep_validators(item, validators)
+        self.agent.record_prices(products)
+        self.stats['products_recorded'] += len(products)
+        if self.on_change is not None:
+            self.on_change(item, products)
+        return 'changed'
+
+
+def read_watchlist(path: str, interval: float, max_results: int) -> List[WatchItem]:
+    """One 'source<TAB>query or product URL' per line, optionally followed by '<TAB>interval seconds'"""
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = [part.strip() for part in line.split('\t')]
+            if len(parts) < 2 or parts[0].lower() not in ('amazon', 'flipkart'):
+                log_event(logger, logging.WARNING, "watchlist_line_skipped", line=line)
+                continue
+            item_interval = float(parts[2]) if len(parts) > 2 else interval
+            items.append(WatchItem(parts[1], parts[0].lower(), interval=item_interval, max_results=max_results))
+    return items
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Continuously re-check a watchlist of queries and product URLs")
+    parser.add_argument("watchlist", help="file with 'source<TAB>query or URL[<TAB>interval]' lines")
+    parser.add_argument("--interval", type=float, default=3600, help="default seconds between checks")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-results", type=int, default=20)
+    parser.add_argument("--amazon-rate", type=float, default=0.2)
+    parser.add_argument("--flipkart-rate", type=float, default=1.0)
+    parser.add_argument("--stats-every", type=float, default=300, help="seconds between stats reports")
+    args = parser.parse_args()
+    configure_logging()
+
+    async with EcommerceAgent() as agent:
+        scheduler = WatchlistScheduler(agent, max_concurrency=args.concurrency,
+                                       host_rates={'www.amazon.in': args.amazon_rate,
+                                                   'www.flipkart.com': args.flipkart_rate})
+        for item in read_watchlist(args.watchlist, args.interval, args.max_results):
+            scheduler.add(item)
+        print(f"Watching {len(scheduler.items)} items")
+
+        runner = asyncio.ensure_future(scheduler.run())
+        try:
+            while True:
+                await asyncio.sleep(args.stats_every)
+                print(json.dumps(scheduler.get_stats(), indent=2), file=sys.stderr)
+        finally:
+            runner.cancel()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass